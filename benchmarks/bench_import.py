@@ -0,0 +1,43 @@
+"""Startup-time benchmark for the headless physics core.
+
+Each import is timed in a fresh interpreter so earlier imports don't hide the cost. Run from anywhere:
+    python benchmarks/bench_import.py
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORE_MODULES = ["vector_methods", "sunlight", "solar_panels", "physics", "fleet"]
+REPEATS = 5
+
+# Imports numpy first so the numbers show the cost of our own modules, then checks vpython was never pulled in
+TIMING_SCRIPT = """
+import sys, time
+import numpy
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed * 1000, 'vpython' in sys.modules)
+"""
+
+def time_import(module):
+    """Return the best import time in milliseconds for a module and whether it imported vpython."""
+    best = None
+    imported_vpython = False
+    for _ in range(REPEATS):
+        output = subprocess.run([sys.executable, "-c", TIMING_SCRIPT.format(module=module)], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.split()
+        elapsed = float(output[0])
+        imported_vpython = imported_vpython or output[1] == "True"
+        best = elapsed if best is None else min(best, elapsed)
+    return best, imported_vpython
+
+def main():
+    print(f"{'module':<16}{'import (ms)':>12}  vpython")
+    for module in CORE_MODULES:
+        elapsed, imported_vpython = time_import(module)
+        print(f"{module:<16}{elapsed:>12.2f}  {'yes' if imported_vpython else 'no'}")
+
+if __name__ == '__main__':
+    main()
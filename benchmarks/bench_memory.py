@@ -0,0 +1,56 @@
+"""Memory benchmark of solar panels stored as objects against a SolarPanelArray.
+
+Run from anywhere (the panel count defaults to one million):
+    python benchmarks/bench_memory.py [count]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from solar_panels import *
+
+def measure(build):
+    """Return (object, bytes allocated, seconds) for a build function."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    built = build()
+    elapsed = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return built, allocated, elapsed
+
+def time_total_area(solar_panels):
+    """Seconds to sum the area of every panel by iterating over them, as code written for objects would."""
+    start = time.perf_counter()
+    sum(panel.area for panel in solar_panels)
+    return time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    surface_vector = np.array([0, -0.5, 1])
+
+    objects, object_bytes, object_time = measure(
+        lambda: [SolarPanelRectangle(2, 1, 0.04, surface_vector, 0.2) for _ in range(count)])
+    object_iteration = time_total_area(objects)
+    del objects
+    array, array_bytes, array_time = measure(lambda: SolarPanelArray.rectangles(count, 2, 1, 0.04, surface_vector, 0.2))
+    array_iteration = time_total_area(array)
+    start = time.perf_counter()
+    array.areas.sum()
+    array_sum = time.perf_counter() - start
+
+    print(f"{count} panels")
+    print(f"{'':<18}{'bytes/panel':>12}{'total (MB)':>12}{'build (s)':>11}{'iterate (s)':>13}")
+    print(f"{'objects':<18}{object_bytes / count:>12.1f}{object_bytes / 1e6:>12.1f}{object_time:>11.3f}"
+          f"{object_iteration:>13.3f}")
+    print(f"{'SolarPanelArray':<18}{array_bytes / count:>12.1f}{array_bytes / 1e6:>12.1f}{array_time:>11.3f}"
+          f"{array_iteration:>13.3f}")
+    print(f"SolarPanelArray column sum instead of iterating: {array_sum:.4f} s; "
+          f"objects use {object_bytes / array_bytes:.1f}x the memory")
+
+if __name__ == '__main__':
+    main()
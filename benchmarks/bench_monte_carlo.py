@@ -0,0 +1,73 @@
+"""Throughput and accuracy of the Monte Carlo energy estimates: streaming statistics against exact ones computed from
+the stored samples, and identical results for any number of worker processes.
+
+Run from anywhere; exits with status 1 if a check fails:
+    python benchmarks/bench_monte_carlo.py --samples 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from monte_carlo import *
+from solar_position import get_sun_vectors, get_time_range
+
+SAMPLES_PER_TASK = 1024
+BLOCK_ELEMENTS = 2 ** 20
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and check the Monte Carlo energy estimates")
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--panels", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    sunlight = get_sun_vectors(40, -105, get_time_range('2024-01-01', '2025-01-01', np.timedelta64(1, 'h')))
+    panels = SolarPanelArray.rectangles(args.panels, 2, 1, 0.04, get_normal_from_tilt_azimuth(40, 180), 0.2)
+
+    timings = {}
+    results = {}
+    for workers in (1, args.workers):
+        start = time.perf_counter()
+        results[workers] = run_monte_carlo(panels, sunlight, args.samples, seed=7, workers=workers,
+                                           samples_per_task=SAMPLES_PER_TASK, block_elements=BLOCK_ELEMENTS)
+        timings[workers] = time.perf_counter() - start
+        print(f"workers={workers or os.cpu_count()}: {args.samples / timings[workers]:,.0f} samples/s "
+              f"({args.samples * args.panels * np.count_nonzero(sunlight.magnitude > 0) / timings[workers] / 1e6:.0f}"
+              f" M panel-steps/s)")
+    print_results(results[1])
+    reproducible = all(np.array_equal(results[1][name], results[args.workers][name])
+                       for name in ("mean", "std", "min", "max", "p50", "p90", "p99"))
+    print(f"Same results for every worker count: {reproducible}")
+
+    # Draw the same samples task by task, keep them all, and compare with the streaming estimates
+    single = results[1]
+    daylight = sunlight.magnitude > 0
+    sunlight = SunlightSeries(sunlight.magnitude[daylight], sunlight.direction[daylight])
+    block_size, time_chunk = get_block_shape(args.panels, len(sunlight), BLOCK_ELEMENTS)
+    task_samples = [min(SAMPLES_PER_TASK, args.samples - first)
+                    for first in range(0, args.samples, SAMPLES_PER_TASK)]
+    energies = []
+    for seed_sequence, count in zip(np.random.SeedSequence(7).spawn(len(task_samples)), task_samples):
+        rng = np.random.default_rng(seed_sequence)
+        for first in range(0, count, block_size):
+            energies.append(get_sample_energies(UncertaintyModel(), rng, min(block_size, count - first),
+                                                normalize_vectors(panels.surface_normals), panels.areas,
+                                                panels.efficiencies, sunlight, time_chunk=time_chunk))
+    energies = np.concatenate(energies)
+    bin_width = 2 * single["nominal"] / len(single["histogram"].counts)
+    exact = {"p50": np.percentile(energies, 50), "p90": np.percentile(energies, 10), "p99": np.percentile(energies, 1)}
+    quantile_error = max(abs(single[name] - value) for name, value in exact.items())
+    moment_error = max(abs(single["mean"] - energies.mean()) / energies.mean(),
+                       abs(single["std"] - energies.std(ddof=1)) / energies.std(ddof=1))
+    print(f"Largest quantile error {quantile_error:.3f} Wh (bin width {bin_width:.3f} Wh), "
+          f"relative moment error {moment_error:.1e}")
+
+    if not (reproducible and quantile_error <= bin_width and moment_error <= 1e-9):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Deterministic benchmark of the interactive update path: record a scripted session of slider drags and button
+presses headless, then replay it and check that the final normal and electricity match. The scripted session ends
+with the panel facing the sun, so it also checks the final normal and the full power.
+
+    python benchmarks/bench_replay.py                    # record and replay a scripted session
+    python benchmarks/bench_replay.py --session my.bin   # replay a session recorded from the live simulation
+"""
+import argparse
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import vpython_stub
+vpython_stub.install()
+
+from session_recording import SessionRecorder, make_simulation, print_replay, replay_session
+from simulation import Simulation
+from solar_panels import SolarPanelRectangle
+from sunlight import Sunlight
+
+SUN_DIRECTION = np.array([1, 0, -1])
+SUN_FACING_NORMAL = -SUN_DIRECTION / np.sqrt(2)
+SUN_FACING_ELECTRICITY = 10 * 10 * 10 # magnitude * area * efficiency of 1
+
+def record_scripted_session(path, drags=200, steps=50, seed=0):
+    """Record drags slider drags of steps events each, with button presses and resets in between, then turn the
+    panel to face the sun: a reset, y set to 0 and x to -1 give the normal (-1, 0, 1) / sqrt(2)."""
+    rng = np.random.default_rng(seed)
+    simulation = Simulation(Sunlight(10, SUN_DIRECTION), SolarPanelRectangle(10, 10, 0.25, np.array([0, 1, 1])),
+                            recorder=SessionRecorder(path))
+    simulation.draw_scene()
+    sliders = [simulation.update_spn_x, simulation.update_spn_y, simulation.update_spn_z]
+    buttons = [simulation.update_spn_x_btn, simulation.update_spn_y_btn, simulation.update_spn_z_btn]
+    for drag in range(drags):
+        axis = rng.integers(3)
+        start, stop = rng.uniform(-1, 1, 2)
+        for value in np.round(np.linspace(start, stop, steps), 2): # sliders move in steps of 0.01
+            sliders[axis](SimpleNamespace(value=value))
+        buttons[rng.integers(3)](np.round(rng.uniform(-1, 1), 2))
+        if drag % 50 == 25:
+            simulation.reset_orientation()
+    simulation.reset_orientation()
+    simulation.update_spn_y_btn(0)
+    simulation.update_spn_x_btn(-1)
+    simulation.recorder.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay an interactive session")
+    parser.add_argument("--session", default=None, help="replay this session file instead of a scripted one")
+    parser.add_argument("--real-time", action="store_true")
+    args = parser.parse_args()
+
+    path = args.session
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "session.bin")
+        record_scripted_session(path)
+        print(f"Recorded {os.path.getsize(path)} bytes to {path}")
+    results = replay_session(path, args.real_time)
+    print_replay(results)
+    passed = results.get("matches", True)
+    if args.session is None:
+        faces_sun = (np.allclose(results["normal"], SUN_FACING_NORMAL, rtol=0, atol=1e-12)
+                     and np.isclose(results["electricity"], SUN_FACING_ELECTRICITY, rtol=1e-12))
+        print(f"Ends facing the sun at {SUN_FACING_ELECTRICITY} Watts: {faces_sun}")
+        passed = passed and faces_sun
+    sys.exit(0 if passed else 1)
+
+if __name__ == '__main__':
+    main()
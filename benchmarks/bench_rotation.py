@@ -0,0 +1,118 @@
+"""Benchmark and drift check of the solar panel orientation: the absolute rotation matrix set used by
+Simulation.align_plane_to_normal against the incremental rotate it replaced, plus batched rotations of many normals.
+
+Run from anywhere (headless, vpython is replaced by vpython_stub); exits with status 1 if the orientation drifts:
+    python benchmarks/bench_rotation.py
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import vpython_stub
+vpython_stub.install()
+from vpython_stub import cross, diff_angle, mag, vector
+
+from rotation import get_panel_axes, get_rotation_from_up
+from simulation import Simulation
+from solar_panels import SolarPanelRectangle
+from sunlight import Sunlight
+from tracker import get_rotated_normals, get_single_axis_basis
+from vector_methods import *
+
+TOLERANCE = 1e-9
+
+def incremental_align(plane, previous_normal, normal):
+    """The previous align_plane_to_normal: turn the plane from the previous normal to the new one."""
+    rotation_axis = cross(previous_normal, normal)
+    if mag(rotation_axis) > 1e-6:
+        rotation_angle = diff_angle(previous_normal, normal)
+        plane.rotate(angle=rotation_angle, axis=rotation_axis, origin=vector(0, 0, 0))
+
+def get_errors(plane, normal, length):
+    """Return how far a plane is from facing normal: angle of its up direction to the normal (radians), its axis
+    away from perpendicular to the normal, and its axis length error."""
+    up = plane.up / mag(plane.up)
+    return (diff_angle(up, normal), abs(plane.axis.dot(normal)) / mag(plane.axis), abs(mag(plane.axis) - length))
+
+def drift_check(updates, seed):
+    """Drive updates random slider and button events through a Simulation, turning a second plane incrementally
+    alongside, and compare both planes with the final normal."""
+    rng = np.random.default_rng(seed)
+    simulation = Simulation(Sunlight(10, np.array([1, 0, -1])), SolarPanelRectangle(10, 10, 0.25, np.array([0, 1, 1])))
+    simulation.draw_scene()
+    incremental_plane = vpython_stub.compound([], axis=vector(simulation.plane_length, 0, 0))
+    incremental_align(incremental_plane, vector(0, 1, 0), simulation.solar_panel_surface_normal_vector)
+
+    axes = rng.integers(3, size=updates)
+    components = np.round(rng.uniform(-1, 1, updates), 2)
+    start = time.perf_counter()
+    for axis, component in zip(axes.tolist(), components.tolist()):
+        previous_normal = simulation.solar_panel_surface_normal_vector
+        simulation.update_solar_panel_normal(axis, component)
+        incremental_align(incremental_plane, previous_normal, simulation.solar_panel_surface_normal_vector)
+    elapsed = time.perf_counter() - start
+
+    normal = simulation.solar_panel_surface_normal_vector
+    absolute_errors = get_errors(simulation.solar_panel_plane, normal, simulation.plane_length)
+    incremental_errors = get_errors(incremental_plane, normal, simulation.plane_length)
+    print(f"{updates} updates in {elapsed:.2f} s (both planes)")
+    for name, errors in (("absolute", absolute_errors), ("incremental", incremental_errors)):
+        print(f"{name:<12} up vs normal {errors[0]:.2e} rad   axis off plane {errors[1]:.2e}   "
+              f"axis length error {errors[2]:.2e}")
+    return max(absolute_errors) <= TOLERANCE
+
+def time_single_updates(count, seed):
+    """Time one orientation update for a single panel, incremental against absolute."""
+    rng = np.random.default_rng(seed)
+    normals = normalize_vectors(rng.normal(size=(count, 3)))
+    vectors = [array_to_vector(*normal) for normal in normals]
+    plane = vpython_stub.compound([], axis=vector(1, 0, 0))
+
+    start = time.perf_counter()
+    for previous_normal, normal in zip(vectors[:-1], vectors[1:]):
+        incremental_align(plane, previous_normal, normal)
+    incremental_time = (time.perf_counter() - start) / (count - 1)
+
+    start = time.perf_counter()
+    for normal, vpython_normal in zip(normals[1:].tolist(), vectors[1:]):
+        length_axis, width_axis = get_panel_axes(*normal)
+        plane.pos = array_to_vector(*[0.01 * c for c in normal])
+        plane.axis = array_to_vector(*length_axis)
+        plane.up = vpython_normal
+    absolute_time = (time.perf_counter() - start) / (count - 1)
+    print(f"single update   incremental {incremental_time * 1e6:7.2f} µs   absolute {absolute_time * 1e6:7.2f} µs")
+
+def time_batched(count, timesteps, seed):
+    """Time batched orientations of many panels, and tracker rotations of a fleet over a day."""
+    rng = np.random.default_rng(seed)
+    normals = normalize_vectors(rng.normal(size=(count, 3)))
+    start = time.perf_counter()
+    get_rotation_from_up(normals)
+    elapsed = time.perf_counter() - start
+    print(f"orientations    {count} panels in {elapsed * 1000:.1f} ms ({count / elapsed / 1e6:.1f} M panels/s)")
+
+    rest_normal, _ = get_single_axis_basis((0, 1, 0))
+    fleet = normalize_vectors(rest_normal + rng.normal(scale=0.02, size=(1000, 3))) # mounting tolerance
+    angles = np.linspace(-60, 60, timesteps)
+    start = time.perf_counter()
+    get_rotated_normals(fleet, angles)
+    elapsed = time.perf_counter() - start
+    print(f"tracker fleet   {timesteps} angles x {len(fleet)} panels in {elapsed * 1000:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and drift check of panel orientation updates")
+    parser.add_argument("--updates", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    time_single_updates(20000, args.seed)
+    time_batched(10 ** 6, 1440, args.seed)
+    if not drift_check(args.updates, args.seed):
+        print(f"Orientation drifted more than {TOLERANCE}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
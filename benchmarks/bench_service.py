@@ -0,0 +1,99 @@
+"""Load test of the electricity service: many clients on persistent connections, reporting latency percentiles.
+
+Starts a service in this process unless --port or --unix points at a running one:
+    python benchmarks/bench_service.py --clients 32 --requests 200
+    python service.py --unix /tmp/solar.sock & python benchmarks/bench_service.py --unix /tmp/solar.sock
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fleet import get_fleet_electricity
+from service import ElectricityService, ServiceClient
+from sunlight import SunlightSeries
+
+def make_fleet(count, rng):
+    normals = rng.normal(size=(count, 3))
+    normals[:, 2] = np.abs(normals[:, 2])
+    return normals, rng.uniform(1, 3, count), rng.uniform(0.15, 0.22, count)
+
+def make_sunlight(timesteps, rng):
+    directions = rng.normal(size=(timesteps, 3))
+    directions[:, 2] = -np.abs(directions[:, 2])
+    return SunlightSeries(rng.uniform(200, 1000, timesteps), directions)
+
+async def run_client(client, fleet, requests, timesteps, concurrency, rng, latencies):
+    """Send requests with up to concurrency outstanding on one connection, recording each latency."""
+    outstanding = asyncio.Semaphore(concurrency)
+
+    async def one_request():
+        sunlight = make_sunlight(timesteps, rng)
+        start = time.perf_counter()
+        power = await client.get_electricity(sunlight, *fleet)
+        latencies.append(time.perf_counter() - start)
+        outstanding.release()
+        return sunlight, power
+
+    tasks = []
+    for _ in range(requests):
+        await outstanding.acquire()
+        tasks.append(asyncio.ensure_future(one_request()))
+    return await asyncio.gather(*tasks)
+
+async def main(args):
+    service = server = None
+    if args.port is None and args.unix is None:
+        service = ElectricityService(batch_window=args.batch_window, threads=args.threads)
+        server = await service.start(port=0)
+        args.port = server.sockets[0].getsockname()[1]
+    rng = np.random.default_rng(0)
+    fleets = [make_fleet(args.panels, rng) for _ in range(args.fleets)]
+    clients = [await ServiceClient.connect(port=args.port, unix_path=args.unix) for _ in range(args.clients)]
+
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        run_client(client, fleets[i % len(fleets)], args.requests, args.timesteps, args.pipeline,
+                   np.random.default_rng(i + 1), latencies) for i, client in enumerate(clients)])
+    elapsed = time.perf_counter() - start
+
+    # spot check every client's first answer against a direct computation
+    for i, client_results in enumerate(results):
+        sunlight, power = client_results[0]
+        assert np.allclose(power, get_fleet_electricity(sunlight, *fleets[i % len(fleets)]))
+    for client in clients:
+        await client.close()
+
+    latencies = np.array(latencies) * 1000
+    total = len(latencies)
+    print(f"{args.clients} clients x {args.requests} requests ({args.pipeline} pipelined), "
+          f"{args.timesteps} timesteps x {args.panels} panels, {args.fleets} fleets")
+    print(f"throughput {total / elapsed:9.1f} requests/s   "
+          f"p50 {np.percentile(latencies, 50):7.2f} ms   p99 {np.percentile(latencies, 99):7.2f} ms   "
+          f"max {latencies.max():7.2f} ms")
+    if service is not None:
+        stats = service.get_stats()
+        print(f"{stats['batches']} batches, {stats['computations']} fleet computations for {stats['requests']} "
+              f"requests ({stats['requests'] / max(stats['computations'], 1):.1f} requests per computation)")
+        server.close()
+        await server.wait_closed()
+        service.executor.shutdown()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the electricity service")
+    parser.add_argument("--port", type=int, default=None, help="port of a running service")
+    parser.add_argument("--unix", default=None, help="Unix socket path of a running service")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=100, help="requests per client")
+    parser.add_argument("--pipeline", type=int, default=4, help="outstanding requests per client")
+    parser.add_argument("--timesteps", type=int, default=60)
+    parser.add_argument("--panels", type=int, default=1000)
+    parser.add_argument("--fleets", type=int, default=2, help="distinct fleets shared among the clients")
+    parser.add_argument("--batch-window", type=float, default=0.002, help="batch window of the in-process service")
+    parser.add_argument("--threads", type=int, default=4, help="threads of the in-process service")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,61 @@
+"""Benchmark of the closed form tracker orientations against a brute-force grid search.
+
+Run from anywhere:
+    python benchmarks/bench_tracker.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from solar_position import get_sun_vectors, get_time_range
+from tracker import *
+from vector_methods import get_normal_from_tilt_azimuth
+
+GRID_STEP = 1 # degrees
+
+def brute_force_dual_axis(sunlight, max_tilt):
+    """Best normal of a tilt/azimuth grid for every timestep."""
+    tilt, azimuth = np.meshgrid(np.arange(0, max_tilt + GRID_STEP, GRID_STEP), np.arange(0, 360, GRID_STEP))
+    candidates = get_normal_from_tilt_azimuth(tilt.ravel(), azimuth.ravel())
+    scores = -sunlight.direction @ candidates.T
+    return candidates[np.argmax(scores, axis=-1)]
+
+def brute_force_single_axis(sunlight, max_angle):
+    """Best normal of a rotation angle grid for every timestep."""
+    rest_normal, turn_direction = get_single_axis_basis((0, 1, 0))
+    angles = np.radians(np.arange(-max_angle, max_angle + GRID_STEP, GRID_STEP))[:, np.newaxis]
+    candidates = np.cos(angles) * rest_normal + np.sin(angles) * turn_direction
+    scores = -sunlight.direction @ candidates.T
+    return candidates[np.argmax(scores, axis=-1)]
+
+def compare(name, closed_form, brute_force, sunlight):
+    """Time both solvers and check the closed form is never worse than the grid."""
+    start = time.perf_counter()
+    normals = closed_form()
+    closed_form_time = time.perf_counter() - start
+    start = time.perf_counter()
+    grid_normals = brute_force()
+    brute_force_time = time.perf_counter() - start
+
+    objective = -np.einsum('ij,ij->i', sunlight.direction, normals)
+    grid_objective = -np.einsum('ij,ij->i', sunlight.direction, grid_normals)
+    print(f"{name:<12} closed form {closed_form_time * 1000:9.2f} ms   grid {brute_force_time * 1000:9.2f} ms   "
+          f"speedup {brute_force_time / closed_form_time:7.1f}x   worst grid advantage "
+          f"{np.max(grid_objective - objective):.2e}")
+    gain = get_tracker_gain(sunlight, normals, get_normal_from_tilt_azimuth(40, 180))
+    print(f"{'':<12} energy gain over a fixed panel (tilt 40°, facing south): {gain * 100:.1f}%")
+
+def main():
+    times = get_time_range('2024-01-01', '2024-01-15') # two weeks at minute resolution
+    sunlight = get_sun_vectors(40, -105, times)
+    print(f"{len(times)} timesteps, {GRID_STEP}° grid")
+    compare("dual-axis", lambda: get_dual_axis_normals(sunlight, 75), lambda: brute_force_dual_axis(sunlight, 75),
+            sunlight)
+    compare("single-axis", lambda: get_single_axis_normals(sunlight, max_angle=60),
+            lambda: brute_force_single_axis(sunlight, 60), sunlight)
+
+if __name__ == '__main__':
+    main()
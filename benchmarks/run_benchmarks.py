@@ -0,0 +1,180 @@
+"""Benchmark suite for the physics core, vector conversions and the interactive update path.
+
+vpython is replaced by vpython_stub, so everything runs headless, including Simulation.update_solar_panel_normal end
+to end. Results are written as json and compared against a stored baseline; the script exits with status 1 when a
+benchmark is slower than the baseline by more than the tolerance.
+
+    python benchmarks/run_benchmarks.py                  # run, write results.json, compare with baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline  # run and store the results as the new baseline
+"""
+import argparse
+import functools
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+import vpython_stub
+vpython_stub.install()
+
+import numpy as np
+import physics
+from efficiency_models import PhysicalIAM
+from fleet import get_fleet_electricity
+from orientation_cache import OrientationCache
+from simulation import Simulation
+from solar_panels import *
+from sunlight import Sunlight
+from vector_methods import *
+
+REPEATS = 7
+
+def measure(function, repeats=REPEATS):
+    """Return the median and best time per call in seconds, timing batches that run for at least 0.2 s."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    times = [elapsed / number for elapsed in timer.repeat(repeats, number)]
+    return {"seconds_per_op": statistics.median(times), "best": min(times), "ops_per_batch": number}
+
+def get_uncached(sunlight, solar_panel):
+    """What OrientationCache.get computes on a miss."""
+    dot_product = physics.get_dot_product(sunlight, solar_panel)
+    return dot_product, physics.get_angle_radians(dot_product), physics.get_electricity(sunlight, solar_panel, dot_product)
+
+def check_fleet_matches_single_panels(count=100_000):
+    """Return True when every panel of a fleet gets exactly the electricity Simulation computes for it alone."""
+    rng = np.random.default_rng(1)
+    sunlight = Sunlight(1000, rng.normal(size=3))
+    # Unnormalized vectors, so the fleet's own normalization (the default) is checked against SolarPanel's
+    vectors = rng.normal(size=(count, 3)) * rng.uniform(0.1, 10, (count, 1))
+    areas = rng.uniform(1, 3, count)
+    efficiencies = rng.uniform(0.15, 0.22, count)
+    panels = [SolarPanel("", area, vector, efficiency) for area, vector, efficiency in zip(areas, vectors, efficiencies)]
+    fleet = get_fleet_electricity(sunlight, vectors, areas, efficiencies)
+    single = np.array([physics.get_electricity(sunlight, panel) for panel in panels])
+    matches = np.count_nonzero(fleet == single)
+    print(f"Fleet against single panel electricity: {matches}/{count} identical")
+    return matches == count
+
+@functools.lru_cache(maxsize=None)
+def get_fleet(count, dtype=np.float64):
+    """Random fleet of count panels: (surface_normals, areas, efficiencies), built once per count and dtype."""
+    rng = np.random.default_rng(count)
+    return (normalize_vectors(rng.normal(size=(count, 3))).astype(dtype), rng.uniform(1, 3, count).astype(dtype),
+            rng.uniform(0.15, 0.22, count).astype(dtype))
+
+def get_drawn_simulation(sunlight):
+    """Simulation with its (stubbed) scene drawn in a fresh scene, for the interactive path."""
+    vpython_stub.reset_scene()
+    simulation = Simulation(sunlight, SolarPanelRectangle(10, 10, 0.25, np.array([0.1, 0.1, 1])))
+    simulation.draw_scene()
+    return simulation
+
+def get_benchmarks():
+    """Return a dict of benchmark name to a setup function, which builds the fixtures of that benchmark only and
+    returns a function running one operation."""
+    sunlight = Sunlight(10, np.array([1, 0, -1]))
+    solar_panel = SolarPanelRectangle(10, 10, 0.25, np.array([0, 1, 1]))
+
+    def cache_hit():
+        cache = OrientationCache()
+        cache.get(sunlight, solar_panel)
+        return lambda: cache.get(sunlight, solar_panel)
+
+    benchmarks = {
+        "physics.get_electricity": lambda: lambda: physics.get_electricity(sunlight, solar_panel),
+        "Simulation.get_electricity": lambda: Simulation(sunlight, solar_panel).get_electricity,
+        # A cache hit has to beat computing the three values directly
+        "OrientationCache.get (hit)": cache_hit,
+        "dot, angle, electricity (no cache)": lambda: lambda: get_uncached(sunlight, solar_panel),
+        "normalize_vector": lambda: lambda: normalize_vector(np.array([0.1, 1.0, 1.0])),
+        "array_to_vector": lambda: lambda: array_to_vector(0.1, 1.0, 1.0),
+        "vector_to_array": lambda: lambda: vector_to_array(0.1, 1.0, 1.0),
+    }
+
+    for count in (100_000, 1_000_000):
+        for dtype, suffix in ((np.float64, ""), (np.float32, ", float32")):
+            benchmarks[f"get_fleet_electricity[{count}{suffix}]"] = (
+                lambda count=count, dtype=dtype: lambda fleet=get_fleet(count, dtype):
+                get_fleet_electricity(sunlight, *fleet, dtype))
+
+    # Incidence angle modifier, exact formula against the lookup table
+    iam_model = PhysicalIAM()
+    get_angles = functools.lru_cache()(lambda: np.random.default_rng(0).uniform(0, np.pi / 2, 1_000_000))
+    benchmarks["PhysicalIAM.get_iam_exact[1000000]"] = lambda: lambda angles=get_angles(): iam_model.get_iam_exact(angles)
+    benchmarks["PhysicalIAM.get_iam[1000000]"] = lambda: lambda angles=get_angles(): iam_model.get_iam(angles)
+
+    def slider_update():
+        # End to end slider update on a drawn (stubbed) scene, sweeping the slider over its whole range
+        simulation = get_drawn_simulation(sunlight)
+        slider_values = itertools.cycle(np.round(np.arange(-1, 1.05, 0.05), 2).tolist())
+        return lambda: simulation.update_solar_panel_normal(0, next(slider_values))
+
+    def idle_frame():
+        # Main loop work of a frame where nothing moved. The stub's properties are plain attributes, so this cannot
+        # show what ChangeTracker saves in a browser: the skipped websocket writes and property read backs
+        simulation = get_drawn_simulation(sunlight)
+        return lambda: (simulation.apply_slider_updates(), simulation.sync_overlay_camera())
+
+    benchmarks["update_solar_panel_normal"] = slider_update
+    benchmarks["idle frame"] = idle_frame
+    return benchmarks
+
+def compare(results, baseline, tolerance):
+    """Print each result against the baseline and return the names that regressed."""
+    regressions = []
+    print(f"{'benchmark':<42}{'time/op':>12}{'baseline':>12}{'ratio':>8}")
+    for name, result in results.items():
+        current = result["seconds_per_op"]
+        previous = baseline.get(name, {}).get("seconds_per_op")
+        ratio = current / previous if previous else None
+        flag = ""
+        if ratio is not None and ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<42}{format_time(current):>12}{format_time(previous):>12}"
+              f"{'' if ratio is None else f'{ratio:.2f}':>8}{flag}")
+    return regressions
+
+def format_time(seconds):
+    """Format a duration with a readable unit."""
+    if seconds is None:
+        return "-"
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=os.path.join(BENCHMARK_DIR, "results.json"))
+    parser.add_argument("--baseline", default=os.path.join(BENCHMARK_DIR, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown, 0.5 means 50%%")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    args = parser.parse_args()
+
+    if not check_fleet_matches_single_panels():
+        sys.exit(1)
+    results = {name: measure(setup()) for name, setup in get_benchmarks().items() if args.filter in name}
+    report = {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+              "results": results}
+    with open(args.baseline if args.save_baseline else args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+class ChangeTracker:
+    def __init__(self):
+        """Pushes attribute values to vpython objects only when they differ from the last value this tracker pushed.
+        Every write to a vpython object is sent to the browser, and reading a property back can cost as much, so the
+        pushed values are remembered here instead of read from the objects. Counts the writes made and skipped."""
+        self.pushed = {} # (id(target), attribute) -> (target, value), the target kept alive so its id is not reused
+        self.writes = 0
+        self.skipped = 0
+
+    def set(self, target, attribute, value):
+        """Set target.attribute to value unless this tracker already pushed that value. Returns True when written."""
+        key = (id(target), attribute)
+        pushed = self.pushed.get(key)
+        value_copy = _copy_value(value)
+        if pushed is not None and pushed[1] == value_copy:
+            self.skipped += 1
+            return False
+        setattr(target, attribute, value)
+        self.pushed[key] = (target, value_copy)
+        self.writes += 1
+        return True
+
+    def forget(self, target, attribute):
+        """Forget the value pushed to target.attribute, e.g. after the user moved a slider, so the next set writes."""
+        self.pushed.pop((id(target), attribute), None)
+
+    def get_stats(self):
+        """Return the write and skipped counters."""
+        return {"writes": self.writes, "skipped": self.skipped}
+
+def _copy_value(value):
+    """Return a comparable copy of an attribute value, vectors as their components since vpython vectors are mutable."""
+    if hasattr(value, "x"):
+        return (value.x, value.y, value.z)
+    return value
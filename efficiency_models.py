@@ -0,0 +1,122 @@
+import numpy as np
+from fleet import get_fleet_dot_products
+
+# Efficiency models: incidence angle modifier (IAM) losses and temperature / low light derating. The exact IAM formula
+# needs several transcendental calls per panel and timestep, so it is evaluated once into a lookup table and
+# interpolated; the table grows until the interpolation error is within the model's tolerance of the exact formula.
+# The temperature model needs a single logarithm, which is cheaper than a table lookup, so it is computed exactly.
+
+class LookupTable:
+    def __init__(self, function, lower, upper, tolerance=1e-4, size=64, max_size=2 ** 20):
+        """Linear interpolation table of a function of one variable from lower to upper. The grid is doubled until
+        the error at the middle of every interval (where linear interpolation is worst for smooth functions) is at
+        most tolerance. Inputs outside [lower, upper] are clamped."""
+        self.lower = lower
+        self.upper = upper
+        while True:
+            grid = np.linspace(lower, upper, size + 1)
+            values = function(grid)
+            midpoints = (grid[:-1] + grid[1:]) / 2
+            self.error = np.max(np.abs(function(midpoints) - (values[:-1] + values[1:]) / 2))
+            if self.error <= tolerance or size >= max_size:
+                break
+            size *= 2
+        self.values = values
+        self.slopes = np.diff(values) # change over one interval
+        self.scale = size / (upper - lower)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __call__(self, x):
+        """Return the interpolated function values for an array of inputs."""
+        return self.interpolate(*self.get_position(x))
+
+    def get_position(self, x):
+        """Return the interval index and the fraction of the way through it for an array of inputs."""
+        position = (np.clip(x, self.lower, self.upper) - self.lower) * self.scale
+        index = np.minimum(position.astype(np.intp), len(self.slopes) - 1)
+        return index, position - index
+
+    def interpolate(self, index, fraction):
+        """Return the interpolated values at positions from get_position."""
+        return self.values[index] + fraction * self.slopes[index]
+
+class PhysicalIAM:
+    def __init__(self, refractive_index=1.526, extinction=4, thickness=0.002, tolerance=1e-4):
+        """Physical incidence angle modifier (De Soto et al.): reflection at the glass surface (Fresnel) and
+        absorption in the glass, relative to normal incidence. extinction is the glazing extinction coefficient in
+        1/m and thickness the glazing thickness in m."""
+        self.refractive_index = refractive_index
+        self.extinction = extinction
+        self.thickness = thickness
+        self.tolerance = tolerance
+        self.normal_transmittance = self._get_transmittance(np.zeros(1))[0]
+        # Tables over the incidence angle (as from Simulation.get_angle_radians) and over its cosine (the dot
+        # product the fleet code already has, which saves the arccos too)
+        self.angle_table = LookupTable(self.get_iam_exact, 0, np.pi / 2, tolerance)
+        self.cos_table = LookupTable(lambda cos: self.get_iam_exact(np.arccos(cos)), 0, 1, tolerance)
+
+    def _get_transmittance(self, angles):
+        """Return the transmittance of the glazing for incidence angles in radians."""
+        angles = np.clip(angles, 1e-9, np.pi / 2 - 1e-9) # the formulas are singular at 0 and 90 degrees
+        refraction = np.arcsin(np.sin(angles) / self.refractive_index)
+        absorption = np.exp(-self.extinction * self.thickness / np.cos(refraction))
+        perpendicular = np.sin(refraction - angles) ** 2 / np.sin(refraction + angles) ** 2
+        parallel = np.tan(refraction - angles) ** 2 / np.tan(refraction + angles) ** 2
+        return absorption * (1 - (perpendicular + parallel) / 2)
+
+    def get_iam_exact(self, angles):
+        """Return the incidence angle modifier for angles in radians (1 at normal incidence, 0 from 90 degrees)."""
+        angles = np.asarray(angles, dtype=float)
+        iam = self._get_transmittance(angles) / self.normal_transmittance
+        return np.where(angles >= np.pi / 2, 0.0, iam)
+
+    def get_iam(self, angles):
+        """Return the incidence angle modifier for angles in radians, from the lookup table."""
+        return self.angle_table(angles)
+
+    def get_iam_from_cos(self, cos_incidence):
+        """Return the incidence angle modifier for the cosine of the incidence angle, from the lookup table."""
+        return self.cos_table(cos_incidence)
+
+class TemperatureModel:
+    # Huld et al. (2011) coefficients k1 to k6 for crystalline silicon modules
+    CRYSTALLINE_SILICON = (-0.017237, -0.040465, -0.004702, 0.000149, 0.000170, 0.000005)
+
+    def __init__(self, noct=45, coefficients=CRYSTALLINE_SILICON):
+        """Relative efficiency from module temperature and irradiance (Huld model), 1 at 25 °C and 1000 W/m². The
+        module temperature follows the NOCT model: ambient + irradiance * (noct - 20) / 800."""
+        self.noct = noct
+        self.coefficients = coefficients
+
+    def get_module_temperature(self, irradiance, ambient_temperature):
+        """Return the module temperature in °C for the plane-of-array irradiance (W/m²) and ambient temperature."""
+        return ambient_temperature + np.asarray(irradiance) * (self.noct - 20) / 800
+
+    def get_relative_efficiency(self, irradiance, ambient_temperature=25):
+        """Return the efficiency relative to standard test conditions. Irradiance below 1 W/m² counts as 1 W/m²,
+        where the logarithm is still finite."""
+        k1, k2, k3, k4, k5, k6 = self.coefficients
+        irradiance = np.maximum(irradiance, 1)
+        log_irradiance = np.log(irradiance / 1000) # the one transcendental call, shared by every term
+        temperature = self.get_module_temperature(irradiance, ambient_temperature) - 25
+        return (1 + log_irradiance * (k1 + k2 * log_irradiance)
+                + temperature * (k3 + log_irradiance * (k4 + k5 * log_irradiance)) + k6 * temperature ** 2)
+
+def get_fleet_electricity(sunlight, surface_normals, areas, efficiencies=1, iam_model=None, temperature_model=None,
+                          ambient_temperature=25, normalize=True):
+    """Return the electricity of every panel in a fleet with incidence angle and temperature losses: beam irradiance
+    on the panel * area * efficiency * IAM * relative efficiency. ambient_temperature (°C) has the shape of the
+    sunlight magnitude or is a scalar. normalize is passed to fleet.get_fleet_dot_products. Without models this is
+    exactly fleet.get_fleet_electricity."""
+    cos_incidence = np.clip(-get_fleet_dot_products(sunlight, surface_normals, normalize=normalize), 0, 1)
+    magnitudes = np.asarray(sunlight.magnitude, dtype=float)[..., np.newaxis]
+    # same order of operations as fleet.get_fleet_electricity, so the results match bit for bit
+    power = magnitudes * np.asarray(areas, dtype=float) * cos_incidence * np.asarray(efficiencies, dtype=float)
+    if iam_model is not None:
+        power *= iam_model.get_iam_from_cos(cos_incidence)
+    if temperature_model is not None:
+        irradiance = magnitudes * cos_incidence
+        power *= temperature_model.get_relative_efficiency(irradiance, np.asarray(ambient_temperature)[..., np.newaxis])
+    return power
@@ -0,0 +1,144 @@
+import os
+
+import numpy as np
+import irradiance
+from fleet import get_fleet_electricity
+
+class EnergyIntegrator:
+    def __init__(self, surface_normals, areas, efficiencies=1, method="trapezoid", irradiance_model=None):
+        """Accumulates the energy collected by a fleet of solar panels from a stream of (timestamps, sunlight) chunks.
+
+        Only running totals and the last one or two samples are kept, never the full power series. method is
+        "trapezoid" or "simpson"; Simpson's rule handles uneven timesteps. Energy is in watt-hours. Power comes from
+        beam light only unless an irradiance model (see irradiance) is given."""
+        if method not in ("trapezoid", "simpson"):
+            raise ValueError(f"Unknown integration method: {method}")
+        self.surface_normals = surface_normals
+        self.areas = areas
+        self.efficiencies = efficiencies
+        self.method = method
+        self.irradiance_model = irradiance_model
+
+        self.energy = 0.0 # Wh per panel, becomes an array once the first interval is added
+        self.samples = 0 # number of power samples integrated so far
+        self.carry_times = np.array([], dtype='datetime64[ns]') # samples not yet closed by a later interval
+        self.carry_power = None
+
+    @property
+    def last_time(self):
+        """Timestamp of the last sample added, None if nothing was added yet. Resume streaming from here."""
+        if self.carry_times.size == 0:
+            return None
+        return self.carry_times[-1]
+
+    def add(self, times, sunlight):
+        """Compute the power of every panel for a chunk of timestamps and a SunlightSeries, and accumulate it.
+        Timestamps at or before last_time are skipped, so a restarted stream may overlap the checkpoint."""
+        times = np.asarray(times, dtype='datetime64[ns]')
+        if self.irradiance_model is None:
+            power = get_fleet_electricity(sunlight, self.surface_normals, self.areas, self.efficiencies)
+        else:
+            power = irradiance.get_fleet_electricity(self.irradiance_model, sunlight, self.surface_normals, self.areas,
+                                                     self.efficiencies)
+        power = np.moveaxis(power, -2, 0) # put the time axis first, (sites, T, N) becomes (T, sites, N)
+        if self.last_time is not None:
+            keep = times > self.last_time
+            times, power = times[keep], power[keep]
+        self.add_power(times, power)
+
+    def add_power(self, times, power):
+        """Accumulate a chunk of power samples in watts. The first axis of power is time."""
+        if len(times) == 0:
+            return
+        self.samples += len(times)
+        if self.carry_power is not None:
+            times = np.concatenate([self.carry_times, times])
+            power = np.concatenate([self.carry_power, power])
+
+        if self.method == "trapezoid":
+            used = len(times)
+            self.energy = self.energy + _get_trapezoid_energy(times, power)
+        else:
+            used = len(times) - (len(times) - 1) % 2 # Simpson's rule needs an even number of intervals
+            self.energy = self.energy + _get_simpson_energy(times[:used], power[:used])
+
+        # Keep the last sample used (and the one left over for Simpson's rule) to join with the next chunk
+        self.carry_times = times[used - 1:]
+        self.carry_power = power[used - 1:].copy()
+
+    def get_energy(self):
+        """Return the energy collected so far by each panel in watt-hours."""
+        energy = self.energy
+        if self.carry_power is not None and len(self.carry_times) > 1: # close the interval left over by Simpson's rule
+            energy = energy + _get_trapezoid_energy(self.carry_times, self.carry_power)
+        return energy
+
+    def get_energy_kwh(self):
+        """Return the energy collected so far by each panel in kilowatt-hours."""
+        return self.get_energy() / 1000
+
+    def save_checkpoint(self, path):
+        """Save the partial sums to path (used as given, no .npz is appended) so a long run can be resumed with
+        load_checkpoint. The file is replaced in one step, so an interrupted save leaves the previous checkpoint."""
+        carry_power = np.array([]) if self.carry_power is None else self.carry_power
+        with open(path + ".tmp", "wb") as file:
+            np.savez(file, energy=self.energy, samples=self.samples, carry_times=self.carry_times,
+                     carry_power=carry_power, method=self.method)
+        os.replace(path + ".tmp", path)
+
+    def load_checkpoint(self, path):
+        """Restore the partial sums saved by save_checkpoint. The fleet itself is not part of the checkpoint."""
+        with np.load(path) as checkpoint:
+            if str(checkpoint["method"]) != self.method:
+                raise ValueError(f"Checkpoint uses the {checkpoint['method']} method, not {self.method}")
+            self.energy = checkpoint["energy"]
+            self.samples = int(checkpoint["samples"])
+            self.carry_times = checkpoint["carry_times"]
+            self.carry_power = checkpoint["carry_power"] if self.carry_times.size else None
+
+def _get_hours(times):
+    """Return the length of each interval between timestamps in hours."""
+    return np.diff(times) / np.timedelta64(1, 'h')
+
+def _expand(values, power):
+    """Reshape a (T,) array to broadcast against a (T, ...) power array."""
+    return values.reshape(values.shape + (1,) * (power.ndim - 1))
+
+def _get_trapezoid_energy(times, power):
+    """Return the trapezoidal integral of power samples in watt-hours."""
+    hours = _expand(_get_hours(times), power)
+    return np.sum(hours * (power[1:] + power[:-1]), axis=0) / 2
+
+def _get_simpson_energy(times, power):
+    """Return Simpson's rule integral of power samples in watt-hours. Needs an odd number of samples; each pair of
+    intervals may have different lengths."""
+    hours = _get_hours(times)
+    h0 = _expand(hours[0::2], power)
+    h1 = _expand(hours[1::2], power)
+    f0, f1, f2 = power[0:-1:2], power[1::2], power[2::2]
+
+    pair_energy = (h0 + h1) / 6 * ((2 - h1 / h0) * f0 + (h0 + h1) ** 2 / (h0 * h1) * f1 + (2 - h0 / h1) * f2)
+    return np.sum(pair_energy, axis=0)
+
+def integrate_energy(chunks, surface_normals, areas, efficiencies=1, method="trapezoid", checkpoint_path=None,
+                     checkpoint_every=30, irradiance_model=None):
+    """Integrate a stream of (timestamps, sunlight) chunks, e.g. from solar_position.iter_sun_vectors, and return the
+    EnergyIntegrator. With a checkpoint_path the partial sums are saved every checkpoint_every chunks and at the end,
+    and an existing checkpoint is resumed from (chunks already covered are skipped)."""
+    integrator = EnergyIntegrator(surface_normals, areas, efficiencies, method, irradiance_model)
+    if checkpoint_path is not None:
+        try:
+            integrator.load_checkpoint(checkpoint_path)
+        except FileNotFoundError:
+            pass
+
+    for count, (times, sunlight) in enumerate(chunks, start=1):
+        if integrator.last_time is not None and times[-1] <= integrator.last_time:
+            continue # already covered by the checkpoint
+        integrator.add(times, sunlight)
+        if checkpoint_path is not None and count % checkpoint_every == 0:
+            integrator.save_checkpoint(checkpoint_path)
+
+    if checkpoint_path is not None:
+        integrator.save_checkpoint(checkpoint_path)
+    return integrator
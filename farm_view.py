@@ -0,0 +1,134 @@
+import numpy as np
+from vpython import *
+
+from change_tracking import ChangeTracker
+from graph3D import *
+from rotation import rotate_from_up
+from solar_panels import *
+from vector_methods import *
+
+# Farm view: draws many solar panels at once. Panels are grouped by geometry and by square tile of the ground; each
+# group is merged into a few compound objects, so a farm of hundreds or thousands of panels is a handful of objects
+# for the browser instead of two primitives per panel. Every compound is built twice, textured (the texture is loaded
+# once) and as plain dark quads. Whenever the camera moves, compounds near the camera show the textured version and
+# the others the plain one; switching is only a change of visibility, nothing is rebuilt.
+
+running = True
+def end_farm_view():
+    global running
+    running = False
+
+class FarmView:
+    def __init__(self, solar_panels, positions=None, lod_distance=40, panels_per_compound=500, scale=0.25,
+                 tile_size=None):
+        """View of a SolarPanelArray (or a list of SolarPanel objects) placed at positions (panel centres in meters,
+        the array's own positions by default). Compounds whose panels are all further than lod_distance meters from
+        the camera are drawn untextured. Panels are merged by tiles of tile_size meters (lod_distance by default),
+        and panels_per_compound caps the size of each merged compound, which keeps every mesh within the browser's
+        vertex limits. scale converts meters to scene units, like solar_c in Simulation."""
+        if not isinstance(solar_panels, SolarPanelArray):
+            solar_panels = SolarPanelArray.from_panels(solar_panels, positions)
+        self.solar_panels = solar_panels
+        self.positions = np.asarray(solar_panels.positions if positions is None else positions, dtype=float)
+        self.lod_distance = lod_distance
+        self.panels_per_compound = panels_per_compound
+        self.scale = scale
+        self.tile_size = lod_distance if tile_size is None else tile_size
+        self.changes = ChangeTracker()
+        self.compounds = [] # (textured compound, plain compound) pairs
+        self.centres = np.zeros((0, 3)) # centre of the panels of each pair, in meters
+        self.radii = np.zeros(0) # distance from that centre to the furthest of its panels
+        self.camera_pos = None # camera position the level of detail was last set for
+        self.model = None
+
+    def get_groups(self):
+        """Return {(shape, length, width, radius, height, tile x, tile y): panel indices} grouping panels drawn the
+        same way on the same tile of the ground."""
+        tiles = np.floor(self.positions[:, :2] / self.tile_size)
+        panels = self.solar_panels
+        keys = np.column_stack([panels.shapes, panels.lengths, panels.widths, panels.radii, panels.heights, tiles])
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        return {tuple(key): np.flatnonzero(inverse == index) for index, key in enumerate(unique_keys.tolist())}
+
+    def draw_panel(self, index, key, length_axis, textured):
+        """Return the primitives of one panel, positioned and oriented, ready to be merged into a compound."""
+        shape, length, width, radius, height = key[:5]
+        c = self.scale
+        pos = array_to_vector(*(self.positions[index] * c))
+        up = array_to_vector(*self.solar_panels.surface_normals[index])
+        top_panel_scale = 1.05
+        if not textured: # level of detail: a single flat quad, no frame and no texture
+            if shape == CIRCLE:
+                return [cylinder(canvas=scene, pos=pos, radius=c * radius, axis=up * 0.01, color=color.gray(0.15))]
+            return [box(canvas=scene, pos=pos, length=c * length, width=c * width, height=0.01, up=up,
+                        axis=length_axis * c * length, color=color.gray(0.15))]
+        if shape == CIRCLE:
+            disk = cylinder(canvas=scene, pos=pos, radius=c * radius * top_panel_scale, axis=up * c * height,
+                            color=color.black)
+            surface = cylinder(canvas=scene, pos=pos + up * 0.04, radius=c * radius, axis=up * 0.06, color=color.white)
+            return [surface, disk]
+        frame = box(canvas=scene, pos=pos, length=c * length * top_panel_scale, width=c * width * top_panel_scale,
+                    height=c * height, up=up, axis=length_axis * c * length * top_panel_scale, color=color.black)
+        surface = box(canvas=scene, pos=pos + up * 0.02, length=c * length, width=c * width, height=0.1, up=up,
+                      axis=length_axis * c * length, color=color.white)
+        return [surface, frame]
+
+    def draw(self):
+        """Draw every panel, merging each group of identical panels into shared compounds."""
+        scene.visible = False  # display nothing while building
+        if self.model is None:
+            self.model = Graph3D(1000, 800) # Set up scene
+
+        length_axes = rotate_from_up(normalize_vectors(self.solar_panels.surface_normals), np.array([1.0, 0.0, 0.0]))
+        centres = []
+        radii = []
+        for key, indices in self.get_groups().items():
+            for first in range(0, len(indices), self.panels_per_compound):
+                chunk = indices[first:first + self.panels_per_compound]
+                pair = []
+                for textured in (True, False):
+                    primitives = []
+                    for index in chunk:
+                        primitives += self.draw_panel(index, key, array_to_vector(*length_axes[index]), textured)
+                    scene.select()
+                    if textured:
+                        pair.append(compound(primitives, texture=SOLAR_PANEL_TEXTURE, shininess=1, visible=False))
+                    else:
+                        pair.append(compound(primitives))
+                self.compounds.append(tuple(pair))
+                centre = self.positions[chunk].mean(axis=0)
+                centres.append(centre)
+                radii.append(np.max(np.linalg.norm(self.positions[chunk] - centre, axis=1)))
+        self.centres = np.array(centres).reshape(-1, 3)
+        self.radii = np.array(radii)
+
+        scene.autoscale = True
+        scene.waitfor("textures")
+        scene.visible = True  # now display everything
+        self.update_level_of_detail()
+
+    def update_level_of_detail(self):
+        """Show the textured version of the compounds within lod_distance of the camera and the plain version of the
+        rest. Does nothing while the camera stays where it was."""
+        camera_pos = (scene.camera.pos.x, scene.camera.pos.y, scene.camera.pos.z)
+        if camera_pos == self.camera_pos:
+            return
+        self.camera_pos = camera_pos
+        camera = vector_to_array(*camera_pos) / self.scale # scene units to meters
+        near = np.linalg.norm(self.centres - camera, axis=1) - self.radii <= self.lod_distance
+        for (textured, plain), is_near in zip(self.compounds, near.tolist()):
+            self.changes.set(textured, "visible", is_near)
+            self.changes.set(plain, "visible", not is_near)
+
+    def run(self):
+        """Draw the farm and keep the scene running until end_farm_view is called."""
+        self.draw()
+        button(text="  END  ", bind=lambda _: end_farm_view(), background=color.white)
+        while running:
+            rate(60)  # Keeps the scene running
+            self.update_level_of_detail()
+            # Lock the overlay to the main scene
+            self.changes.set(self.model.overlay.camera, "pos", scene.camera.pos)
+            self.changes.set(self.model.overlay.camera, "axis", scene.camera.axis)
+            self.changes.set(self.model.overlay.camera, "up", scene.camera.up)
@@ -0,0 +1,27 @@
+import numpy as np
+import physics
+from vector_methods import *
+
+def get_fleet_dot_products(sunlight, surface_normals, dtype=np.float64, normalize=True):
+    """Return the clipped dot product between the sunlight direction and an (N,3) array of surface normals. A Sunlight
+    gives an (N,) result; a SunlightSeries with directions of shape (...,3) gives a (...,N) result."""
+    surface_normals = np.asarray(surface_normals, dtype=dtype)
+    if normalize: # normalize surface normals if not already normalized, same as SolarPanel
+        surface_normals = normalize_vectors(surface_normals)
+    direction = np.asarray(sunlight.direction, dtype=dtype)
+
+    return physics.get_dot_products(direction, surface_normals)
+
+def get_fleet_electricity(sunlight, surface_normals, areas, efficiencies=1, dtype=np.float64, normalize=True):
+    """Return the electricity of every solar panel in a fleet given a sunlight vector, an (N,3) array of surface
+    normals and arrays (or scalars) of areas and efficiencies. Each entry is exactly Simulation.get_electricity for the
+    same panel (checked by benchmarks/run_benchmarks.py). Pass dtype=np.float32 to halve memory use on very large fleets.
+
+    sunlight may also be a SunlightSeries (e.g. from solar_position), in which case the result has one row of N
+    panels per sunlight vector."""
+    dot_products = get_fleet_dot_products(sunlight, surface_normals, dtype, normalize)
+    # same as Simulation.magnitude, broadcast over the panels for a SunlightSeries
+    magnitudes = np.asarray(sunlight.magnitude, dtype=dtype)[..., np.newaxis] * np.asarray(areas, dtype=dtype)
+
+    result = -1 * magnitudes * dot_products * np.asarray(efficiencies, dtype=dtype)
+    return np.clip(result, 0, None, out=result) # negative electricity is an unphysical result in this scenario
@@ -0,0 +1,99 @@
+import json
+import os
+
+import numpy as np
+from solar_panels import *
+
+# Columnar on-disk format for panel fleets and their results. A fleet is a directory holding fleet.json (number of
+# panels, the dtype and shape of each column and the string table of generic panel names) and one raw little-endian
+# file per column. Columns are opened with
+# np.memmap, so opening a 10 million panel fleet reads nothing but the header, and slicing a column only touches the
+# pages of that slice.
+
+FLEET_FORMAT = "solar-panel-fleet"
+RESULTS_FORMAT = "solar-panel-results"
+VERSION = 1
+
+# name: (dtype, shape of one row)
+FLEET_COLUMNS = {
+    "surface_normals": ("<f8", (3,)),
+    "areas": ("<f8", ()),
+    "efficiencies": ("<f8", ()),
+    "shapes": ("u1", ()), # RECTANGLE, CIRCLE or GENERIC from solar_panels
+    "lengths": ("<f8", ()),
+    "widths": ("<f8", ()),
+    "radii": ("<f8", ()),
+    "heights": ("<f8", ()),
+    "positions": ("<f8", (3,)), # panel centres in meters
+    "name_ids": ("<u4", ()), # index into the names string table of fleet.json
+}
+
+def _write_header(path, name, header):
+    """Write a json header into a format directory, creating the directory."""
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, name), "w") as file:
+        json.dump(header, file, indent=2)
+
+def _read_header(path, name, expected_format):
+    """Read and check the json header of a format directory."""
+    with open(os.path.join(path, name)) as file:
+        header = json.load(file)
+    if header.get("format") != expected_format:
+        raise ValueError(f"{path} is not a {expected_format} directory")
+    if header.get("version") != VERSION:
+        raise ValueError(f"Unsupported {expected_format} version: {header.get('version')}")
+    return header
+
+def _open_column(path, name, dtype, shape, mode):
+    """Memory-map one column file. mode is "r", "r+" or "w+" as for np.memmap."""
+    if 0 in shape: # np.memmap cannot map an empty file
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode=mode, shape=shape)
+
+def create_fleet(path, count, names=("",)):
+    """Create an empty fleet of count panels on disk and return it as a SolarPanelArray of writable memory-mapped
+    columns. names is the string table the name_ids column indexes. Filling the columns in slices lets fleets larger
+    than memory be written; call flush on the array to write them out."""
+    _write_header(path, "fleet.json", {"format": FLEET_FORMAT, "version": VERSION, "count": count,
+                                       "columns": {name: {"dtype": dtype, "shape": list(shape)}
+                                                   for name, (dtype, shape) in FLEET_COLUMNS.items()},
+                                       "names": list(names)})
+    return SolarPanelArray(names=names, **{name: _open_column(path, name, dtype, (count,) + shape, "w+")
+                                           for name, (dtype, shape) in FLEET_COLUMNS.items()})
+
+def save_fleet(path, solar_panels):
+    """Save a SolarPanelArray (or a list of SolarPanel objects) to a fleet directory."""
+    if not isinstance(solar_panels, SolarPanelArray):
+        solar_panels = SolarPanelArray.from_panels(solar_panels)
+    stored = create_fleet(path, len(solar_panels), solar_panels.names)
+    for name, column in stored.columns.items():
+        column[...] = solar_panels.columns[name]
+    stored.flush()
+
+def load_fleet(path, mode="r"):
+    """Open a fleet directory and return it as a SolarPanelArray of memory-mapped columns. Use mode="r+" to modify
+    it in place. Convert slices to SolarPanel objects with to_panels."""
+    header = _read_header(path, "fleet.json", FLEET_FORMAT)
+    count = header["count"]
+    return SolarPanelArray(names=header.get("names", ("",)),
+                           **{name: _open_column(path, name, column["dtype"], (count,) + tuple(column["shape"]), mode)
+                              for name, column in header["columns"].items()})
+
+def create_power_results(path, times, count, dtype="<f4"):
+    """Create a (timesteps, panels) power results file for an array of timestamps and count panels and return the
+    writable memory-mapped power array. Rows can be filled chunk by chunk as a simulation streams."""
+    times = np.asarray(times, dtype="datetime64[ns]")
+    _write_header(path, "results.json", {"format": RESULTS_FORMAT, "version": VERSION, "steps": len(times),
+                                         "count": count, "dtype": np.dtype(dtype).str})
+    stored_times = _open_column(path, "times", "<M8[ns]", (len(times),), "w+")
+    stored_times[...] = times
+    if isinstance(stored_times, np.memmap):
+        stored_times.flush()
+    return _open_column(path, "power", dtype, (len(times), count), "w+")
+
+def load_power_results(path, mode="r"):
+    """Open a power results directory and return (times, power) as memory-mapped arrays."""
+    header = _read_header(path, "results.json", RESULTS_FORMAT)
+    times = _open_column(path, "times", "<M8[ns]", (header["steps"],), mode)
+    power = _open_column(path, "power", header["dtype"], (header["steps"], header["count"]), mode)
+    return times, power
@@ -1,5 +1,8 @@
 from vpython import *
 
+# Texture of the solar panel surface, loaded by the browser once and shared by every panel that uses it
+SOLAR_PANEL_TEXTURE = "textures/SolarPanel002_1K-JPG_Color.jpg"
+
 class Graph3D:
     def __init__(self, width, height):
         # Define vector at origin
@@ -0,0 +1,100 @@
+import atexit
+import cProfile
+import functools
+import pstats
+import time
+from collections import deque
+
+import numpy as np
+
+class Instrumentation:
+    def __init__(self, frame_rate=60, history=10000, profile_path=None):
+        """Opt-in timing of the Simulation event loop and callbacks. Pass an instance to Simulation to enable it;
+        without one nothing is wrapped or timed. Keeps the last history samples of each timing for percentiles.
+
+        With a profile_path, cProfile runs from now on and its stats are dumped there at exit (read them with
+        pstats)."""
+        self.frame_time = 1 / frame_rate # target time between frames
+        self.frame_times = deque(maxlen=history)
+        self.frames = 0
+        self.dropped_frames = 0
+        self.last_tick = None
+        self.callbacks = {} # name: [calls, total seconds, deque of latencies]
+        self.history = history
+
+        self.profile_path = profile_path
+        self.profiler = None
+        if profile_path is not None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            atexit.register(self.dump_profile)
+
+    def tick(self):
+        """Record the end of a frame of the event loop. A frame longer than the target counts the frames it missed
+        as dropped."""
+        now = time.perf_counter()
+        if self.last_tick is not None:
+            elapsed = now - self.last_tick
+            self.frames += 1
+            self.frame_times.append(elapsed)
+            self.dropped_frames += max(0, round(elapsed / self.frame_time) - 1)
+        self.last_tick = now
+
+    def record(self, name, seconds):
+        """Record one call of a callback that took seconds."""
+        stats = self.callbacks.get(name)
+        if stats is None:
+            stats = self.callbacks[name] = [0, 0.0, deque(maxlen=self.history)]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2].append(seconds)
+
+    def wrap(self, name, function):
+        """Return function wrapped to record its latency under name."""
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return timed
+
+    def instrument(self, target, names):
+        """Replace the methods names of an object with timed versions, on that object only."""
+        for name in names:
+            setattr(target, name, self.wrap(name, getattr(target, name)))
+
+    def get_snapshot(self):
+        """Return the current metrics: frame count and timing, dropped frames and per-callback latency (seconds)."""
+        snapshot = {"frames": self.frames, "dropped_frames": self.dropped_frames,
+                    "frame_time": _summarize(self.frame_times), "callbacks": {}}
+        for name, (calls, total, latencies) in self.callbacks.items():
+            snapshot["callbacks"][name] = dict(calls=calls, total=total, **_summarize(latencies))
+        return snapshot
+
+    def print(self):
+        """Prints the metrics snapshot."""
+        snapshot = self.get_snapshot()
+        frame_time = snapshot["frame_time"]
+        print(f"Frames: {snapshot['frames']}, Dropped: {snapshot['dropped_frames']}, "
+              f"Frame time: mean {frame_time['mean'] * 1000:.2f} ms, p99 {frame_time['p99'] * 1000:.2f} ms")
+        for name, stats in snapshot["callbacks"].items():
+            print(f"{name}: {stats['calls']} calls, mean {stats['mean'] * 1000:.3f} ms, "
+                  f"p99 {stats['p99'] * 1000:.3f} ms, max {stats['max'] * 1000:.3f} ms")
+
+    def dump_profile(self):
+        """Stop profiling and write the cProfile stats to profile_path."""
+        if self.profiler is None:
+            return
+        self.profiler.disable()
+        pstats.Stats(self.profiler).dump_stats(self.profile_path)
+        self.profiler = None
+
+def _summarize(samples):
+    """Return mean, p50, p99 and max of a sequence of durations (zeros when empty)."""
+    if not samples:
+        return {"mean": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+    samples = np.fromiter(samples, dtype=float)
+    p50, p99 = np.percentile(samples, [50, 99])
+    return {"mean": samples.mean(), "p50": p50, "p99": p99, "max": samples.max()}
@@ -0,0 +1,122 @@
+import numpy as np
+import physics
+from solar_position import SOLAR_CONSTANT, get_air_mass
+from vector_methods import *
+
+# Plane-of-array irradiance models. A Sunlight or SunlightSeries magnitude is the direct normal (beam) irradiance in
+# W/m². Models split the irradiance reaching each panel into beam, sky diffuse and ground reflected parts.
+#
+# Every model works in two steps: get_sun_coefficients computes everything that only depends on the sun (zenith,
+# horizontal irradiances, Perez brightness coefficients, ...) once per timestep, and get_poa_irradiance combines those
+# with the surface normals of any number of panels. Results have shape (..., N) for sunlight of shape (...).
+
+class IrradianceModel:
+    def __init__(self, albedo=0.2, diffuse_ratio=0.1):
+        """Base irradiance model. albedo is the ground reflectance. diffuse_ratio estimates the diffuse horizontal
+        irradiance as a fraction of the beam irradiance when none is given."""
+        self.albedo = albedo
+        self.diffuse_ratio = diffuse_ratio
+
+    def get_sun_coefficients(self, sunlight, diffuse_horizontal=None):
+        """Return a dict of per-timestep values shared by every panel. diffuse_horizontal is the diffuse horizontal
+        irradiance (W/m²) with the same shape as the sunlight magnitude."""
+        beam = np.asarray(sunlight.magnitude, dtype=float)
+        direction = np.asarray(sunlight.direction, dtype=float)
+        cos_zenith = np.clip(-direction[..., 2], 0, 1) # sunlight travels down while the sun is up
+        if diffuse_horizontal is None:
+            diffuse_horizontal = self.diffuse_ratio * beam * (cos_zenith > 0)
+        diffuse_horizontal = np.asarray(diffuse_horizontal, dtype=float)
+        return {"direction": direction, "beam": beam, "cos_zenith": cos_zenith,
+                "diffuse_horizontal": diffuse_horizontal,
+                "global_horizontal": beam * cos_zenith + diffuse_horizontal}
+
+    def get_poa_irradiance(self, coefficients, surface_normals):
+        """Return a dict of beam, sky_diffuse, ground_reflected and total plane-of-array irradiance in W/m²."""
+        surface_normals = np.asarray(surface_normals, dtype=float)
+        cos_incidence = np.clip(-physics.get_dot_products(coefficients["direction"], surface_normals), 0, 1)
+        beam = coefficients["beam"][..., np.newaxis] * cos_incidence
+        cos_tilt = np.clip(surface_normals[:, 2], -1, 1)
+        sky_diffuse = self.get_sky_diffuse(coefficients, surface_normals, cos_incidence, cos_tilt)
+        ground_reflected = (self.albedo * coefficients["global_horizontal"][..., np.newaxis] * (1 - cos_tilt) / 2)
+        return {"beam": beam, "sky_diffuse": sky_diffuse, "ground_reflected": ground_reflected,
+                "total": beam + sky_diffuse + ground_reflected}
+
+    def get_sky_diffuse(self, coefficients, surface_normals, cos_incidence, cos_tilt):
+        """Return the sky diffuse irradiance on each panel. The base model has no diffuse light."""
+        return np.zeros_like(cos_incidence)
+
+    def get_irradiance(self, sunlight, surface_normals, diffuse_horizontal=None):
+        """Return the plane-of-array irradiance components for a Sunlight or SunlightSeries and (N,3) normals."""
+        coefficients = self.get_sun_coefficients(sunlight, diffuse_horizontal)
+        return self.get_poa_irradiance(coefficients, normalize_vectors(surface_normals))
+
+class BeamModel(IrradianceModel):
+    def __init__(self):
+        """Beam irradiance only, the model used by Simulation.get_electricity: magnitude * cos(incidence)."""
+        super().__init__(albedo=0.0, diffuse_ratio=0.0)
+
+class IsotropicSkyModel(IrradianceModel):
+    """Liu-Jordan model: diffuse light comes evenly from the whole sky dome, plus ground reflected light."""
+
+    def get_sky_diffuse(self, coefficients, surface_normals, cos_incidence, cos_tilt):
+        return coefficients["diffuse_horizontal"][..., np.newaxis] * (1 + cos_tilt) / 2
+
+class PerezSkyModel(IrradianceModel):
+    """Perez (1990) model: isotropic sky plus circumsolar and horizon brightening, weighted by coefficients that
+    depend on the sky clearness and brightness."""
+
+    # Clearness bin lower edges and the all sites composite coefficients f11, f12, f13, f21, f22, f23 of each bin
+    CLEARNESS_BINS = np.array([1.065, 1.23, 1.5, 1.95, 2.8, 4.5, 6.2])
+    COEFFICIENTS = np.array([
+        [-0.008, 0.588, -0.062, -0.060, 0.072, -0.022],
+        [0.130, 0.683, -0.151, -0.019, 0.066, -0.029],
+        [0.330, 0.487, -0.221, 0.055, -0.064, -0.026],
+        [0.568, 0.187, -0.295, 0.109, -0.152, -0.014],
+        [0.873, -0.392, -0.362, 0.226, -0.462, 0.001],
+        [1.132, -1.237, -0.412, 0.288, -0.823, 0.056],
+        [1.060, -1.600, -0.359, 0.264, -1.127, 0.131],
+        [0.678, -0.327, -0.250, 0.156, -1.377, 0.251],
+    ])
+
+    def get_sun_coefficients(self, sunlight, diffuse_horizontal=None):
+        coefficients = super().get_sun_coefficients(sunlight, diffuse_horizontal)
+        cos_zenith = coefficients["cos_zenith"]
+        diffuse = coefficients["diffuse_horizontal"]
+        zenith = np.arccos(cos_zenith)
+        has_diffuse = diffuse > 0
+        safe_diffuse = np.where(has_diffuse, diffuse, 1)
+
+        # Sky clearness and brightness
+        kappa_zenith = 1.041 * zenith ** 3
+        clearness = ((diffuse + coefficients["beam"]) / safe_diffuse + kappa_zenith) / (1 + kappa_zenith)
+        brightness = diffuse * get_air_mass(cos_zenith) / SOLAR_CONSTANT
+        f = self.COEFFICIENTS[np.digitize(clearness, self.CLEARNESS_BINS)]
+
+        coefficients["circumsolar"] = np.where(has_diffuse,
+                                               np.maximum(0, f[..., 0] + f[..., 1] * brightness + f[..., 2] * zenith), 0)
+        coefficients["horizon"] = np.where(has_diffuse, f[..., 3] + f[..., 4] * brightness + f[..., 5] * zenith, 0)
+        coefficients["circumsolar_divisor"] = np.maximum(np.cos(np.radians(85)), cos_zenith)
+        return coefficients
+
+    def get_sky_diffuse(self, coefficients, surface_normals, cos_incidence, cos_tilt):
+        circumsolar = coefficients["circumsolar"][..., np.newaxis]
+        horizon = coefficients["horizon"][..., np.newaxis]
+        sin_tilt = np.sqrt(1 - cos_tilt ** 2)
+        sky = ((1 - circumsolar) * (1 + cos_tilt) / 2
+               + circumsolar * cos_incidence / coefficients["circumsolar_divisor"][..., np.newaxis]
+               + horizon * sin_tilt)
+        return np.maximum(0, coefficients["diffuse_horizontal"][..., np.newaxis] * sky)
+
+IRRADIANCE_MODELS = {"beam": BeamModel, "isotropic": IsotropicSkyModel, "perez": PerezSkyModel}
+
+def get_irradiance_model(name, **parameters):
+    """Return an irradiance model by name ("beam", "isotropic" or "perez")."""
+    if name not in IRRADIANCE_MODELS:
+        raise ValueError(f"Unknown irradiance model: {name}")
+    return IRRADIANCE_MODELS[name](**parameters)
+
+def get_fleet_electricity(irradiance_model, sunlight, surface_normals, areas, efficiencies=1, diffuse_horizontal=None):
+    """Return the electricity of every panel in a fleet using an irradiance model: plane-of-array irradiance * area *
+    efficiency. With BeamModel this equals fleet.get_fleet_electricity."""
+    irradiance = irradiance_model.get_irradiance(sunlight, surface_normals, diffuse_horizontal)["total"]
+    return irradiance * np.asarray(areas, dtype=float) * np.asarray(efficiencies, dtype=float)
@@ -0,0 +1,268 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from fleet import get_fleet_electricity
+from solar_panels import *
+from sunlight import SunlightSeries
+from vector_methods import *
+
+# Monte Carlo energy estimates (P50, P90, ...) for a fleet under uncertain panel efficiency, soiling, orientation and
+# sunlight. Samples are drawn and evaluated in vectorized blocks. Each block's energies are folded into mergeable
+# streaming statistics (moments and a fixed range histogram) and then dropped, so memory does not grow with the number
+# of samples. The samples are split into fixed tasks, each with its own random stream spawned from one seed, and the
+# task statistics are merged in task order, so results do not depend on the number of worker processes.
+
+class UncertaintyModel:
+    def __init__(self, efficiency_spread=0.02, soiling=(0.0, 0.05), orientation_tolerance=1.0, magnitude_spread=0.05):
+        """Sources of uncertainty of one sample (e.g. one year of operation):
+        efficiency_spread: relative standard deviation of each panel's efficiency (manufacturing tolerance).
+        soiling: (lowest, highest) fraction of energy lost to soiling, uniform over the fleet.
+        orientation_tolerance: standard deviation in degrees of each panel's surface normal from its design normal,
+            in a uniformly random direction (mounting tolerance).
+        magnitude_spread: relative standard deviation of the sunlight magnitude over the whole series (year to year
+            variability)."""
+        self.efficiency_spread = efficiency_spread
+        self.soiling = soiling
+        self.orientation_tolerance = orientation_tolerance
+        self.magnitude_spread = magnitude_spread
+
+    def sample_normals(self, rng, surface_normals, count):
+        """Return (count, N, 3) unit normals tilted from (N, 3) unit surface_normals by the orientation tolerance."""
+        angles = np.radians(self.orientation_tolerance) * rng.standard_normal((count, len(surface_normals), 1))
+        # Random direction perpendicular to each normal to tilt towards
+        directions = rng.standard_normal((count,) + surface_normals.shape)
+        directions -= np.einsum('snj,nj->sn', directions, surface_normals)[..., np.newaxis] * surface_normals
+        directions = normalize_vectors(directions)
+        return np.cos(angles) * surface_normals + np.sin(angles) * directions
+
+    def sample_efficiencies(self, rng, efficiencies, count):
+        """Return (count, N) efficiencies spread around (N,) efficiencies, never below zero."""
+        factors = 1 + self.efficiency_spread * rng.standard_normal((count, len(efficiencies)))
+        return efficiencies * np.clip(factors, 0, None)
+
+    def sample_factors(self, rng, count):
+        """Return (count,) factors applied to the whole fleet's energy: soiling losses and sunlight magnitude."""
+        soiling = rng.uniform(self.soiling[0], self.soiling[1], count)
+        magnitude = np.clip(1 + self.magnitude_spread * rng.standard_normal(count), 0, None)
+        return (1 - soiling) * magnitude
+
+class StreamingMoments:
+    def __init__(self):
+        """Count, mean, variance, minimum and maximum of a stream of values, updated a block at a time. Blocks are
+        combined with Chan et al.'s pairwise update, so two instances can be merged in any split of the stream."""
+        self.count = 0
+        self.mean = 0.0
+        self.sum_of_squares = 0.0 # sum of squared differences from the mean
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values):
+        """Add a block of values."""
+        values = np.asarray(values, dtype=float).ravel()
+        if len(values) == 0:
+            return
+        block = StreamingMoments()
+        block.count = len(values)
+        block.mean = values.mean()
+        block.sum_of_squares = np.sum((values - block.mean) ** 2)
+        block.min = values.min()
+        block.max = values.max()
+        self.merge(block)
+
+    def merge(self, other):
+        """Combine the values of another StreamingMoments into this one."""
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.sum_of_squares += other.sum_of_squares + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        """Sample variance (zero for fewer than two values)."""
+        return self.sum_of_squares / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+class StreamingHistogram:
+    def __init__(self, lower, upper, bins=10000):
+        """Histogram of a stream of values over a fixed range, for quantiles without storing the values. Quantiles
+        are exact to within one bin width, (upper - lower) / bins. Values outside the range are counted below or
+        above it. Histograms with the same range and bins merge by adding counts."""
+        self.lower = float(lower)
+        self.upper = float(upper)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+
+    @property
+    def count(self):
+        return int(self.counts.sum()) + self.below + self.above
+
+    def add(self, values):
+        """Add a block of values."""
+        values = np.asarray(values, dtype=float).ravel()
+        self.below += int(np.count_nonzero(values < self.lower))
+        self.above += int(np.count_nonzero(values > self.upper))
+        inside = values[(values >= self.lower) & (values <= self.upper)]
+        index = ((inside - self.lower) * (len(self.counts) / (self.upper - self.lower))).astype(np.intp)
+        self.counts += np.bincount(np.minimum(index, len(self.counts) - 1), minlength=len(self.counts))
+
+    def merge(self, other):
+        """Combine the counts of another StreamingHistogram with the same range and bins into this one."""
+        if (other.lower, other.upper, len(other.counts)) != (self.lower, self.upper, len(self.counts)):
+            raise ValueError("Only histograms with the same range and bins can be merged")
+        self.counts += other.counts
+        self.below += other.below
+        self.above += other.above
+
+    def get_quantile(self, q):
+        """Return the q quantile (0 to 1), interpolating linearly inside its bin. Quantiles falling below or above the
+        range return its lower or upper bound."""
+        target = q * self.count
+        if target <= self.below:
+            return self.lower
+        cumulative = self.below + np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, target))
+        if index >= len(self.counts):
+            return self.upper
+        before = cumulative[index] - self.counts[index]
+        fraction = (target - before) / self.counts[index] if self.counts[index] else 0.0
+        width = (self.upper - self.lower) / len(self.counts)
+        return self.lower + (index + fraction) * width
+
+    def get_exceedance(self, probability):
+        """Return the value exceeded with the given probability, e.g. 0.9 for P90."""
+        return self.get_quantile(1 - probability)
+
+def get_sample_energies(model, rng, count, surface_normals, areas, efficiencies, sunlight, step_hours=1,
+                        time_chunk=1440):
+    """Return the (count,) fleet energies in Wh of count samples drawn from model with rng, for (N,3) unit surface
+    normals, (N,) areas and efficiencies, and a SunlightSeries sampled every step_hours."""
+    normals = model.sample_normals(rng, surface_normals, count)
+    sampled_efficiencies = model.sample_efficiencies(rng, efficiencies, count)
+    factors = model.sample_factors(rng, count)
+
+    # Irradiation (Wh/m²) on every sampled panel, one time chunk at a time to bound the (T, count*N) power array
+    flat_normals = normals.reshape(-1, 3)
+    irradiation = np.zeros(len(flat_normals))
+    for start in range(0, len(sunlight), time_chunk):
+        power = get_fleet_electricity(sunlight[start:start + time_chunk], flat_normals, 1, normalize=False)
+        irradiation += power.sum(axis=0)
+    irradiation = irradiation.reshape(count, -1) * step_hours
+    return np.einsum('sn,sn,n->s', irradiation, sampled_efficiencies, areas) * factors
+
+def get_block_shape(panel_count, time_steps, block_elements):
+    """Return (block_size, time_chunk): the samples evaluated together and the timesteps per chunk, chosen so the
+    (time_chunk, block_size * panel_count) power arrays of a block hold about block_elements values whatever the
+    fleet size. Timesteps are filled first, so small fleets evaluate the whole series in one chunk."""
+    time_chunk = max(1, min(time_steps, block_elements // panel_count))
+    block_size = max(1, block_elements // (panel_count * time_chunk))
+    return block_size, time_chunk
+
+_worker_state = {} # fleet, sunlight and model of this worker process, sent once by _init_worker
+
+def _init_worker(state):
+    _worker_state.update(state)
+
+def _run_task(seed_sequence, samples, block_size, lower, upper, bins):
+    """Draw samples in blocks from the task's own random stream and return their moments and histogram."""
+    state = _worker_state
+    rng = np.random.default_rng(seed_sequence)
+    moments = StreamingMoments()
+    histogram = StreamingHistogram(lower, upper, bins)
+    for start in range(0, samples, block_size):
+        energies = get_sample_energies(state["model"], rng, min(block_size, samples - start), state["surface_normals"],
+                                       state["areas"], state["efficiencies"], state["sunlight"], state["step_hours"],
+                                       state["time_chunk"])
+        moments.add(energies)
+        histogram.add(energies)
+    return moments, histogram
+
+def run_monte_carlo(solar_panels, sunlight, samples, model=None, step_hours=1, seed=0, workers=None,
+                    samples_per_task=1024, block_elements=2 ** 20, bins=10000, value_range=None):
+    """Estimate the distribution of the energy (Wh) of a fleet (SolarPanelArray or list of SolarPanel) over a
+    SunlightSeries sampled every step_hours, from samples draws of an UncertaintyModel (the default one if None).
+
+    Samples run in tasks of samples_per_task on a pool of workers (one per CPU by default, workers=1 runs in this
+    process). Each task evaluates its samples in blocks sized by get_block_shape, so a block's power arrays hold about
+    block_elements values (8 MB each by default) for any fleet. Task t draws from the stream spawned as child t of
+    np.random.SeedSequence(seed), one block after another, so the result depends on seed, samples_per_task and the
+    block size (from block_elements, the fleet size and the number of daylight timesteps) but not on the number of
+    workers. Quantiles come from a histogram of bins bins over value_range, by default zero to twice the energy
+    without any uncertainty.
+
+    Returns a dict with the nominal energy, sample count, mean, std, min, max, P50, P90 and P99 (values exceeded
+    with 50%, 90% and 99% probability), and the merged StreamingMoments and StreamingHistogram for other
+    statistics."""
+    if not isinstance(solar_panels, SolarPanelArray):
+        solar_panels = SolarPanelArray.from_panels(solar_panels)
+    model = UncertaintyModel() if model is None else model
+    daylight = np.asarray(sunlight.magnitude) > 0 # night time steps add nothing, so they are skipped
+    sunlight = SunlightSeries(sunlight.magnitude[daylight], sunlight.direction[daylight])
+    state = {"model": model, "surface_normals": normalize_vectors(solar_panels.surface_normals),
+             "areas": np.asarray(solar_panels.areas, dtype=float),
+             "efficiencies": np.asarray(solar_panels.efficiencies, dtype=float), "sunlight": sunlight,
+             "step_hours": step_hours}
+    block_size, state["time_chunk"] = get_block_shape(len(state["areas"]), len(sunlight), block_elements)
+
+    nominal = float(np.sum(get_fleet_electricity(sunlight, state["surface_normals"], state["areas"],
+                                                 state["efficiencies"], normalize=False)) * step_hours)
+    lower, upper = (0.0, 2 * nominal) if value_range is None else value_range
+    if upper <= lower:
+        raise ValueError("The fleet produces no energy, give a value_range")
+
+    task_samples = [min(samples_per_task, samples - first) for first in range(0, samples, samples_per_task)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(task_samples))
+    arguments = [(seed_sequence, count, block_size, lower, upper, bins)
+                 for seed_sequence, count in zip(seed_sequences, task_samples)]
+    if workers == 1:
+        _init_worker(state)
+        results = [_run_task(*task) for task in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(state,)) as executor:
+            results = list(executor.map(_run_task, *zip(*arguments))) # in task order, whichever finishes first
+
+    moments = StreamingMoments()
+    histogram = StreamingHistogram(lower, upper, bins)
+    for task_moments, task_histogram in results:
+        moments.merge(task_moments)
+        histogram.merge(task_histogram)
+    return {"nominal": nominal, "samples": moments.count, "mean": moments.mean, "std": moments.std,
+            "min": moments.min, "max": moments.max, "p50": histogram.get_exceedance(0.5),
+            "p90": histogram.get_exceedance(0.9), "p99": histogram.get_exceedance(0.99), "moments": moments,
+            "histogram": histogram}
+
+def print_results(results):
+    """Prints the energy estimates of run_monte_carlo in kWh."""
+    print(f"Samples: {results['samples']}, Nominal: {results['nominal'] / 1000:.1f} kWh")
+    print(f"Mean: {results['mean'] / 1000:.1f} kWh, Std: {results['std'] / 1000:.1f} kWh, "
+          f"Min: {results['min'] / 1000:.1f} kWh, Max: {results['max'] / 1000:.1f} kWh")
+    print(f"P50: {results['p50'] / 1000:.1f} kWh, P90: {results['p90'] / 1000:.1f} kWh, "
+          f"P99: {results['p99'] / 1000:.1f} kWh")
+
+if __name__ == '__main__':
+    from solar_position import get_sun_vectors, get_time_range
+
+    parser = argparse.ArgumentParser(description="P50/P90 energy of a small fleet over a clear-sky year")
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--panels", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    # Square panels tilted 40° towards the south at 40°N, sunlight every hour of 2024
+    sunlight = get_sun_vectors(40, -105, get_time_range('2024-01-01', '2025-01-01', np.timedelta64(1, 'h')))
+    panels = SolarPanelArray.rectangles(args.panels, 2, 1, 0.04, get_normal_from_tilt_azimuth(40, 180), 0.2)
+    start = time.perf_counter()
+    results = run_monte_carlo(panels, sunlight, args.samples, seed=args.seed, workers=args.workers)
+    print_results(results)
+    print(f"{time.perf_counter() - start:.1f} s")
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+import physics
+
+class OrientationCache:
+    def __init__(self, max_size=4096, resolution=1e-9):
+        """Bounded least recently used cache of the dot product, incidence angle and electricity for a sunlight and a
+        solar panel orientation. Keys are the sun direction, magnitude, surface normal, area and efficiency rounded to
+        multiples of resolution, so orientations on the same slider step share an entry. Fleets skip the cache:
+        quantizing and deduplicating their rows costs more than fleet.get_fleet_electricity computing every panel."""
+        self.max_size = max_size
+        self.resolution = resolution
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_key(self, sunlight, solar_panel):
+        """Return the quantized key for a Sunlight and a SolarPanel. Built from plain floats: numpy's per call overhead
+        on seven values would cost more than the computation a hit saves."""
+        resolution = self.resolution
+        x, y, z = sunlight.direction.tolist()
+        normal_x, normal_y, normal_z = solar_panel.surface_normal.tolist()
+        return (round(x / resolution), round(y / resolution), round(z / resolution),
+                round(float(sunlight.magnitude) / resolution), round(normal_x / resolution),
+                round(normal_y / resolution), round(normal_z / resolution),
+                round(float(solar_panel.area) / resolution), round(float(solar_panel.efficiency) / resolution))
+
+    def get(self, sunlight, solar_panel):
+        """Return (dot_product, angle_radians, electricity) for a Sunlight and a SolarPanel, computing them on a miss."""
+        key = self.get_key(sunlight, solar_panel)
+        entry = self.lookup(key)
+        if entry is None:
+            dot_product = physics.get_dot_product(sunlight, solar_panel)
+            entry = (dot_product, physics.get_angle_radians(dot_product),
+                     physics.get_electricity(sunlight, solar_panel, dot_product))
+            self.store(key, entry)
+        return entry
+
+    def lookup(self, key):
+        """Return the entry for a key and mark it as recently used, or None (counted as a miss)."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, entry):
+        """Add an entry, evicting the least recently used one when the cache is full."""
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self):
+        """Return the hit, miss and eviction counters and the current size."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.entries),
+                "max_size": self.max_size}
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
@@ -0,0 +1,31 @@
+import numpy as np
+
+DOT_PRODUCTS = '...j,nj->...n' # (...,3) directions with (N,3) normals, the one kernel for every dot product
+PAIRED_DOT_PRODUCTS = '...j,...j->...' # (...,3) directions with one (...,3) normal each, e.g. a tracker per timestep
+
+def get_dot_products(directions, surface_normals, paired=False):
+    """Return the dot products of (...,3) sunlight directions with (N,3) surface normals as a (...,N) array, clipped
+    to [-1, 1]. The one kernel behind get_dot_product, the fleet engine, trackers and irradiance models, so a panel gets
+    exactly the same value everywhere (np.dot can round differently). With paired=True surface_normals has the shape
+    of directions and each direction is paired with its own normal, giving a (...) array."""
+    dot_products = np.asarray(np.einsum(PAIRED_DOT_PRODUCTS if paired else DOT_PRODUCTS, directions, surface_normals))
+    return np.clip(dot_products, -1.0, 1.0, out=dot_products)
+
+def get_dot_product(sunlight, solar_panel):
+    """Return the dot product between the sunlight direction and the solar panel surface normal, clipped to [-1, 1]."""
+    # Same kernel as get_dot_products, clipped with min and max since np.clip costs more than the product for one value
+    dot_product = np.einsum(DOT_PRODUCTS, sunlight.direction, np.asarray(solar_panel.surface_normal)[np.newaxis])[0]
+    return min(max(dot_product, -1.0), 1.0)
+
+def get_electricity(sunlight, solar_panel, dot_product=None):
+    """Return the total electricity given a sunlight vector, area vector, and solar panel efficiency."""
+    if dot_product is None:
+        dot_product = get_dot_product(sunlight, solar_panel)
+    result = -1 * sunlight.magnitude * solar_panel.area * dot_product * solar_panel.efficiency
+    if result < 0: # negative electricity is an unphysical result in this scenario
+        result = 0
+    return result
+
+def get_angle_radians(dot_product):
+    """Return the angle between the sunlight direction and the surface normal given their dot product."""
+    return np.arccos(dot_product)
@@ -0,0 +1,71 @@
+import numpy as np
+from vector_methods import *
+
+# Orientations as 3x3 rotation matrices, batched over any leading dimensions: (...,3,3) rotations act on (...,3)
+# vectors. A panel's orientation is the rotation taking it from lying flat (facing z) to its surface normal; its
+# columns are the turned length axis, width axis and the normal itself. Setting an orientation from the normal every
+# time, instead of turning the previous one, means nothing accumulates however many updates there are.
+
+IDENTITY = np.eye(3)
+
+def _cross_matrices(vectors):
+    """Return the (...,3,3) matrices [v]x with [v]x @ u == cross(v, u)."""
+    matrices = np.zeros(vectors.shape + (3,))
+    matrices[..., 0, 1] = -vectors[..., 2]
+    matrices[..., 0, 2] = vectors[..., 1]
+    matrices[..., 1, 0] = vectors[..., 2]
+    matrices[..., 1, 2] = -vectors[..., 0]
+    matrices[..., 2, 0] = -vectors[..., 1]
+    matrices[..., 2, 1] = vectors[..., 0]
+    return matrices
+
+def get_rotation_between(from_vectors, to_vectors):
+    """Return the (...,3,3) smallest rotations taking unit from_vectors to unit to_vectors, without trigonometry:
+    R = c I + [k]x + k kᵀ / (1 + c) with k = from × to and c = from · to (Rodrigues' formula). Opposite vectors turn
+    half a revolution about the axis perpendicular to from_vectors closest to the coordinate axis it is least aligned
+    with, e.g. about x for z to -z."""
+    from_vectors, to_vectors = np.broadcast_arrays(np.asarray(from_vectors, dtype=float),
+                                                   np.asarray(to_vectors, dtype=float))
+    k = np.cross(from_vectors, to_vectors)
+    c = np.einsum('...j,...j->...', from_vectors, to_vectors)
+    opposite = c < -1 + 1e-12
+    scale = 1 / np.where(opposite, 1, 1 + c)
+    rotations = k[..., :, np.newaxis] * (k * scale[..., np.newaxis])[..., np.newaxis, :]
+    rotations += c[..., np.newaxis, np.newaxis] * IDENTITY + _cross_matrices(k)
+
+    if np.any(opposite):
+        least_aligned = IDENTITY[np.argmin(np.abs(from_vectors), axis=-1)]
+        along = np.einsum('...j,...j->...', least_aligned, from_vectors)
+        half_turn_axis = normalize_vectors(least_aligned - along[..., np.newaxis] * from_vectors)
+        half_turn = 2 * half_turn_axis[..., :, np.newaxis] * half_turn_axis[..., np.newaxis, :] - IDENTITY
+        rotations = np.where(opposite[..., np.newaxis, np.newaxis], half_turn, rotations)
+    return rotations
+
+def get_rotation_from_up(surface_normals):
+    """Return the (...,3,3) orientations of panels facing unit surface_normals: the smallest rotations taking the z
+    axis to each normal."""
+    return get_rotation_between(np.array([0.0, 0.0, 1.0]), surface_normals)
+
+def get_axis_angle_rotations(axes, angles):
+    """Return the (...,3,3) rotations by angles (degrees, shape (...)) about axes ((...,3) or one (3,) axis),
+    counterclockwise looking down the axis."""
+    axes = normalize_vectors(np.asarray(axes, dtype=float))
+    angles = np.radians(np.asarray(angles, dtype=float))[..., np.newaxis, np.newaxis]
+    outer = axes[..., :, np.newaxis] * axes[..., np.newaxis, :]
+    return np.cos(angles) * (IDENTITY - outer) + np.sin(angles) * _cross_matrices(axes) + outer
+
+def rotate_vectors(rotations, vectors):
+    """Apply (...,3,3) rotations to (...,3) vectors, broadcasting the leading dimensions."""
+    return np.einsum('...ij,...j->...i', rotations, vectors)
+
+def rotate_from_up(surface_normals, vectors):
+    """Rotate vectors by the smallest rotation taking the z axis to each surface normal."""
+    return rotate_vectors(get_rotation_from_up(surface_normals), vectors)
+
+def get_panel_axes(x, y, z):
+    """Return the length axis and width axis of a single panel facing the unit normal (x, y, z): the first two columns
+    of get_rotation_from_up, worked out with plain floats since numpy's call overhead dominates for one panel."""
+    if z < -1 + 1e-12: # facing straight down: half a revolution about x
+        return (1.0, 0.0, 0.0), (0.0, -1.0, 0.0)
+    scale = 1 / (1 + z)
+    return (z + y * y * scale, -x * y * scale, -x), (-x * y * scale, z + x * x * scale, -y)
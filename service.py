@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from fleet import get_fleet_electricity
+from sunlight import SunlightSeries
+
+# Local asyncio service answering batched electricity queries over a TCP or Unix socket.
+#
+# Every message is a 4 byte big-endian header length, a json header and the raw bytes of the arrays it lists:
+#     {"id": 1, "arrays": {"directions": {"dtype": "<f8", "shape": [T, 3]}, ...}}
+# A request carries directions (T,3) and magnitudes (T,) of sunlight and surface_normals (N,3), areas (N,) and
+# efficiencies (N,) of a fleet; the response carries power (T,N) under the same id, or an "error" string.
+# Connections stay open for any number of requests and may pipeline them; responses can arrive out of order.
+#
+# Requests arriving within batch_window seconds of each other are grouped, and requests for the same fleet are
+# stacked into a single fleet computation. NumPy work, including hashing each request's fleet to group it, runs in a
+# thread pool so the event loop never blocks. Each connection
+# may have max_in_flight requests waiting; beyond that the service stops reading from it, which pushes back on the
+# client through the socket buffers.
+
+REQUEST_ARRAYS = ("directions", "magnitudes", "surface_normals", "areas", "efficiencies")
+
+class ProtocolError(Exception):
+    """A message that cannot be decoded. The rest of the stream cannot be trusted, so the connection is closed after
+    replying with the error (under the message id when it could be read)."""
+    def __init__(self, message, request_id=None):
+        super().__init__(message)
+        self.request_id = request_id
+
+async def read_message(reader):
+    """Read one message and return (header, arrays), or None at the end of the stream. Raises ProtocolError for a
+    message that is not valid json or lists arrays that are not numeric."""
+    try:
+        prefix = await reader.readexactly(4)
+    except asyncio.IncompleteReadError:
+        return None
+    try:
+        header = json.loads(await reader.readexactly(struct.unpack("!I", prefix)[0]))
+        if not isinstance(header, dict):
+            raise ValueError("the header is not a json object")
+    except ValueError as error: # includes json and utf-8 decoding errors
+        raise ProtocolError(f"Invalid header: {error}")
+    request_id = header.get("id")
+    arrays = {}
+    try:
+        for name, spec in header.pop("arrays", {}).items():
+            dtype = np.dtype(spec["dtype"])
+            shape = tuple(int(size) for size in spec["shape"])
+            if dtype.kind not in "fiu" or min(shape, default=0) < 0:
+                raise ValueError(f"{name} must be a numeric array with a valid shape")
+            data = await reader.readexactly(int(np.prod(shape)) * dtype.itemsize)
+            arrays[name] = np.frombuffer(data, dtype=dtype).reshape(shape)
+    except (KeyError, TypeError, ValueError, AttributeError) as error:
+        raise ProtocolError(f"Invalid array description: {error}", request_id)
+    return header, arrays
+
+def write_message(writer, header, arrays=None):
+    """Queue one message on a stream writer. Await writer.drain() to respect the peer's flow control."""
+    arrays = {name: np.ascontiguousarray(array) for name, array in (arrays or {}).items()}
+    header = dict(header, arrays={name: {"dtype": array.dtype.str, "shape": list(array.shape)}
+                                  for name, array in arrays.items()})
+    encoded = json.dumps(header).encode()
+    writer.write(struct.pack("!I", len(encoded)) + encoded)
+    for array in arrays.values():
+        writer.write(array.tobytes())
+
+def validate_request(arrays):
+    """Raise ValueError unless a request has every array with consistent shapes: directions (T,3), magnitudes (T,),
+    surface_normals (N,3), areas (N,) and efficiencies (N,). Checked before batching, so a bad request is rejected
+    alone and never stacked with the others."""
+    missing = [name for name in REQUEST_ARRAYS if name not in arrays]
+    if missing:
+        raise ValueError(f"Missing arrays: {', '.join(missing)}")
+    timesteps = len(arrays["magnitudes"]) if arrays["magnitudes"].ndim == 1 else -1
+    panels = len(arrays["surface_normals"]) if arrays["surface_normals"].ndim == 2 else -1
+    expected = {"magnitudes": (timesteps,), "directions": (timesteps, 3), "surface_normals": (panels, 3),
+                "areas": (panels,), "efficiencies": (panels,)}
+    for name, shape in expected.items():
+        if arrays[name].shape != shape or -1 in shape:
+            raise ValueError(f"{name} has shape {arrays[name].shape}, expected directions (T,3), magnitudes (T,), "
+                             f"surface_normals (N,3), areas (N,) and efficiencies (N,)")
+
+def get_fleet_key(arrays):
+    """Return a key identifying the fleet of a request, so requests for the same fleet can share a computation."""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in ("surface_normals", "areas", "efficiencies"):
+        digest.update(str(arrays[name].shape).encode())
+        digest.update(np.ascontiguousarray(arrays[name], dtype=float).tobytes())
+    return digest.digest()
+
+class ElectricityService:
+    def __init__(self, batch_window=0.002, max_batch=256, max_in_flight=32, threads=4):
+        """Service state: batch_window seconds to wait for more requests before computing, at most max_batch
+        requests per batch, at most max_in_flight waiting requests per connection, threads NumPy worker threads."""
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_in_flight = max_in_flight
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.pending = [] # (fleet key, arrays, future) waiting for the next batch
+        self.batch_timer = None
+        self.requests = 0
+        self.batches = 0
+        self.computations = 0
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        """Start listening on a Unix socket path, or on host and port. Returns the asyncio server."""
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path=unix_path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests from one connection until it closes."""
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        try:
+            while True:
+                await in_flight.acquire() # back-pressure: stop reading while too many requests are waiting
+                try:
+                    message = await read_message(reader)
+                except ProtocolError as error:
+                    write_message(writer, {"id": error.request_id, "error": str(error)})
+                    await writer.drain()
+                    in_flight.release()
+                    break
+                if message is None:
+                    in_flight.release()
+                    break
+                task = asyncio.ensure_future(self.answer(message, writer, in_flight))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def answer(self, message, writer, in_flight):
+        """Compute one request through the batcher and write its response."""
+        header, arrays = message
+        try:
+            validate_request(arrays)
+            key = await asyncio.get_running_loop().run_in_executor(self.executor, get_fleet_key, arrays)
+            power = await self.submit(key, arrays)
+            write_message(writer, {"id": header.get("id")}, {"power": power})
+        except Exception as error:
+            write_message(writer, {"id": header.get("id"), "error": str(error)})
+        finally:
+            in_flight.release()
+        await writer.drain()
+
+    def submit(self, key, arrays):
+        """Queue a validated request with its fleet key for the next batch and return a future of its power array."""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((key, arrays, future))
+        self.requests += 1
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.batch_timer is None:
+            self.batch_timer = asyncio.get_running_loop().call_later(self.batch_window, self.flush)
+        return future
+
+    def flush(self):
+        """Start computing every pending request, one computation per distinct fleet."""
+        if self.batch_timer is not None:
+            self.batch_timer.cancel()
+            self.batch_timer = None
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        self.batches += 1
+        groups = {}
+        for key, arrays, future in pending:
+            groups.setdefault(key, []).append((arrays, future))
+        for group in groups.values():
+            self.computations += 1
+            asyncio.ensure_future(self.compute_group(group))
+
+    async def compute_group(self, group):
+        """Compute the requests of one fleet together in the thread pool and resolve their futures."""
+        loop = asyncio.get_running_loop()
+        try:
+            power = await loop.run_in_executor(self.executor, compute_stacked, [arrays for arrays, _ in group])
+        except Exception as error:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (_, future), result in zip(group, power):
+            if not future.done():
+                future.set_result(result)
+
+    def get_stats(self):
+        """Return the request, batch and computation counters."""
+        return {"requests": self.requests, "batches": self.batches, "computations": self.computations}
+
+def compute_stacked(requests):
+    """Compute the power of several requests for the same fleet with one fleet computation, split per request."""
+    first = requests[0]
+    sunlight = SunlightSeries(np.concatenate([np.asarray(request["magnitudes"], dtype=float) for request in requests]),
+                              np.concatenate([np.asarray(request["directions"], dtype=float) for request in requests]))
+    power = get_fleet_electricity(sunlight, first["surface_normals"], first["areas"], first["efficiencies"])
+    bounds = np.cumsum([len(request["magnitudes"]) for request in requests])[:-1]
+    return np.split(power, bounds)
+
+class ServiceClient:
+    def __init__(self, reader, writer):
+        """Client keeping one connection open for many, possibly concurrent, requests."""
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+        self.waiting = {} # id: future of the response
+        self.receiver = asyncio.ensure_future(self.receive())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765, unix_path=None):
+        """Open a connection to a service on a Unix socket path, or on host and port."""
+        if unix_path is not None:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def receive(self):
+        """Resolve waiting requests as their responses arrive."""
+        while True:
+            message = await read_message(self.reader)
+            if message is None:
+                break
+            header, arrays = message
+            future = self.waiting.pop(header["id"], None)
+            if future is None or future.done():
+                continue
+            if "error" in header:
+                future.set_exception(RuntimeError(header["error"]))
+            else:
+                future.set_result(arrays["power"])
+        for future in self.waiting.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Connection closed"))
+
+    async def get_electricity(self, sunlight, surface_normals, areas, efficiencies=1):
+        """Return the (T,N) power of a fleet for a SunlightSeries (or Sunlight, giving a (1,N) result)."""
+        surface_normals = np.asarray(surface_normals, dtype=float).reshape(-1, 3)
+        count = len(surface_normals)
+        request_id = self.next_id
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[request_id] = future
+        write_message(self.writer, {"id": request_id}, {
+            "directions": np.asarray(sunlight.direction, dtype=float).reshape(-1, 3),
+            "magnitudes": np.asarray(sunlight.magnitude, dtype=float).reshape(-1),
+            "surface_normals": surface_normals,
+            "areas": np.broadcast_to(np.asarray(areas, dtype=float), count),
+            "efficiencies": np.broadcast_to(np.asarray(efficiencies, dtype=float), count),
+        })
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.receiver.cancel()
+
+async def serve(host, port, unix_path, batch_window, threads):
+    service = ElectricityService(batch_window=batch_window, threads=threads)
+    server = await service.start(host, port, unix_path)
+    print(f"Serving on {unix_path or f'{host}:{port}'}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve batched solar panel electricity queries")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--batch-window", type=float, default=0.002, help="seconds to wait for more requests")
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.unix, args.batch_window, args.threads))
@@ -0,0 +1,196 @@
+import argparse
+import functools
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from instrumentation import _summarize
+from solar_panels import *
+from sunlight import Sunlight
+
+# Simulation callbacks that are recorded, in the order of their event codes
+EVENT_NAMES = ["update_spn_x", "update_spn_y", "update_spn_z", "update_spn_x_btn", "update_spn_y_btn",
+               "update_spn_z_btn", "reset_orientation", "restart_program"]
+SLIDER_EVENTS = {"update_spn_x", "update_spn_y", "update_spn_z"} # called with a slider, its value is recorded
+
+# A session file is a fixed size json header (padded with spaces) followed by one 17 byte record per event. The header
+# holds the starting sunlight and solar panel, and the final normal and electricity once the recording is closed.
+MAGIC = b"SPSESSION1\n"
+HEADER_SIZE = 2048
+EVENT_DTYPE = np.dtype([("time", "<f8"), ("event", "u1"), ("value", "<f8")]) # seconds since start, code, value
+
+def get_state(simulation):
+    """Return the sunlight, solar panel and electricity of a Simulation as a json friendly dict."""
+    panel = simulation.solar_panel
+    state = {
+        "sunlight": {"magnitude": float(simulation.sunlight.magnitude),
+                     "direction": [float(x) for x in simulation.sunlight.direction]},
+        "solar_panel": {"name": panel.name, "area": float(panel.area), "efficiency": float(panel.efficiency),
+                        "surface_normal": [float(x) for x in panel.surface_normal]},
+        "electricity": float(simulation.electricity),
+    }
+    for attribute in ("length", "width", "radius", "height"):
+        if hasattr(panel, attribute):
+            state["solar_panel"][attribute] = float(getattr(panel, attribute))
+    return state
+
+def get_solar_panel(state):
+    """Rebuild the solar panel of a state dict."""
+    panel = state["solar_panel"]
+    normal = np.array(panel["surface_normal"])
+    if panel["name"] in ("Square", "Rectangle"):
+        return SolarPanelRectangle(panel["length"], panel["width"], panel["height"], normal, panel["efficiency"])
+    if panel["name"] == "Circle":
+        return SolarPanelCircle(panel["radius"], panel["height"], normal, panel["efficiency"])
+    return SolarPanel(panel["name"], panel["area"], normal, panel["efficiency"])
+
+def get_sunlight(state):
+    """Rebuild the sunlight of a state dict."""
+    return Sunlight(state["sunlight"]["magnitude"], np.array(state["sunlight"]["direction"]))
+
+class SessionRecorder:
+    def __init__(self, path):
+        """Records every slider and button event of a Simulation with its time to a session file. Pass an instance
+        to Simulation (recorder=...) or call attach; close it to store the final state used to verify replays."""
+        self.path = path
+        self.file = None
+        self.header = None
+        self.start = None
+        self.events = 0
+
+    def attach(self, simulation):
+        """Start recording: write the header and wrap the recorded callbacks of simulation, on that object only."""
+        self.simulation = simulation
+        self.header = {"initial": get_state(simulation), "final": None, "events": 0}
+        self.file = open(self.path, "wb")
+        self.write_header()
+        self.start = time.perf_counter()
+        for code, name in enumerate(EVENT_NAMES):
+            setattr(simulation, name, self.wrap(code, name, getattr(simulation, name)))
+
+    def wrap(self, code, name, function):
+        """Return function wrapped to record its calls as events code."""
+        is_slider = name in SLIDER_EVENTS
+
+        @functools.wraps(function)
+        def recorded(*args):
+            value = np.nan
+            if args:
+                value = args[0].value if is_slider else args[0]
+            self.record(code, value)
+            if name == "restart_program": # the process is replaced, so the recording ends here
+                self.close(restarted=True)
+            return function(*args)
+        return recorded
+
+    def record(self, code, value):
+        """Append one event to the file."""
+        record = np.array((time.perf_counter() - self.start, code, value), dtype=EVENT_DTYPE)
+        self.file.write(record.tobytes())
+        self.events += 1
+
+    def write_header(self):
+        encoded = json.dumps(self.header).encode()
+        if len(MAGIC) + len(encoded) + 1 > HEADER_SIZE:
+            raise ValueError("Session header does not fit in HEADER_SIZE")
+        self.file.seek(0)
+        self.file.write(MAGIC + encoded.ljust(HEADER_SIZE - len(MAGIC) - 1) + b"\n")
+
+    def close(self, restarted=False):
+        """Store the final state and close the file. After a restart the program starts over from the initial state."""
+        if self.file is None:
+            return
+        self.header["final"] = self.header["initial"] if restarted else get_state(self.simulation)
+        self.header["events"] = self.events
+        end = self.file.tell()
+        self.write_header()
+        self.file.seek(end)
+        self.file.close()
+        self.file = None
+
+def load_session(path):
+    """Return the header dict and the structured array of events of a session file."""
+    with open(path, "rb") as file:
+        prefix = file.read(HEADER_SIZE)
+    if not prefix.startswith(MAGIC):
+        raise ValueError(f"{path} is not a session file")
+    header = json.loads(prefix[len(MAGIC):])
+    events = np.fromfile(path, dtype=EVENT_DTYPE, offset=HEADER_SIZE)
+    return header, events
+
+def make_simulation(state):
+    """Create a headless Simulation with its scene drawn from a state dict, in a fresh scene as after a restart.
+    Installs vpython_stub unless vpython was already imported."""
+    import vpython_stub
+    if "vpython" not in sys.modules:
+        vpython_stub.install()
+    if sys.modules["vpython"] is vpython_stub:
+        vpython_stub.reset_scene()
+    from simulation import Simulation
+    simulation = Simulation(get_sunlight(state), get_solar_panel(state))
+    simulation.draw_scene()
+    return simulation
+
+def replay_session(path, real_time=False):
+    """Feed the events of a session file through the update methods of a headless Simulation, as fast as possible or
+    at the recorded pace. Returns the replay metrics, including whether the final normal and electricity match."""
+    header, events = load_session(path)
+    simulation = make_simulation(header["initial"])
+    latencies = {name: [] for name in EVENT_NAMES}
+
+    start = time.perf_counter()
+    for recorded_time, code, value in events.tolist():
+        name = EVENT_NAMES[code]
+        if real_time:
+            time.sleep(max(0.0, recorded_time - (time.perf_counter() - start)))
+        event_start = time.perf_counter()
+        if name == "restart_program": # start over instead of replacing the process
+            simulation = make_simulation(header["initial"])
+        elif name == "reset_orientation":
+            simulation.reset_orientation()
+        elif name in SLIDER_EVENTS:
+            getattr(simulation, name)(SimpleNamespace(value=value))
+        else:
+            getattr(simulation, name)(value)
+        latencies[name].append(time.perf_counter() - event_start)
+    elapsed = time.perf_counter() - start
+
+    results = {"events": len(events), "seconds": elapsed, "events_per_second": len(events) / elapsed if elapsed else 0.0,
+               "recorded_seconds": float(events["time"][-1]) if len(events) else 0.0,
+               "callbacks": {name: dict(calls=len(samples), **_summarize(samples))
+                             for name, samples in latencies.items() if samples},
+               "normal": simulation.solar_panel.surface_normal.tolist(), "electricity": float(simulation.electricity)}
+    final = header["final"]
+    if final is not None:
+        normal_error = np.max(np.abs(simulation.solar_panel.surface_normal - final["solar_panel"]["surface_normal"]))
+        electricity_error = abs(simulation.electricity - final["electricity"])
+        results["normal_error"] = float(normal_error)
+        results["electricity_error"] = float(electricity_error)
+        results["matches"] = bool(normal_error <= 1e-12 and electricity_error <= 1e-9)
+    return results
+
+def print_replay(results):
+    """Prints the metrics of a replay."""
+    print(f"Replayed {results['events']} events in {results['seconds']:.3f} s "
+          f"({results['events_per_second']:.0f} events/s, recorded over {results['recorded_seconds']:.1f} s)")
+    for name, stats in results["callbacks"].items():
+        print(f"{name}: {stats['calls']} calls, mean {stats['mean'] * 1000:.3f} ms, "
+              f"p99 {stats['p99'] * 1000:.3f} ms, max {stats['max'] * 1000:.3f} ms")
+    print(f"Final normal: ({', '.join(f'{x:.6f}' for x in results['normal'])}), "
+          f"Electricity: {results['electricity']:.6f} Watts")
+    if "matches" in results:
+        print(f"Matches recording: {results['matches']} (normal error {results['normal_error']:.2e}, "
+              f"electricity error {results['electricity_error']:.2e})")
+    else:
+        print("Recording was not closed, final state not verified")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a recorded Simulation session headless")
+    parser.add_argument("path")
+    parser.add_argument("--real-time", action="store_true", help="keep the recorded pace instead of running flat out")
+    args = parser.parse_args()
+    results = replay_session(args.path, args.real_time)
+    print_replay(results)
+    sys.exit(0 if results.get("matches", True) else 1)
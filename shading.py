@@ -0,0 +1,138 @@
+import numpy as np
+from rotation import get_rotation_from_up
+from solar_panels import CIRCLE, RECTANGLE, SolarPanelArray
+from vector_methods import *
+
+# Inter-row shading between solar panels placed at given positions. Each panel is a thin rectangle or disk centred on
+# its position and facing its surface normal. Points sampled on each panel are traced towards the sun and tested
+# against the panels that could be in the way; a uniform grid over the plane perpendicular to the sunlight keeps the
+# number of candidate occluders per panel small, so the cost grows with N log N (for sorting) instead of N².
+
+def get_sample_offsets(shapes, lengths, widths, radii, samples):
+    """Return (N, samples², 2) in-plane offsets of equal-area sample points on each panel. Rectangles use a regular
+    grid; disks use rings of equal area so every sample stands for the same share of the panel."""
+    fractions = (np.arange(samples) + 0.5) / samples
+    grid_a, grid_b = np.meshgrid(fractions - 0.5, fractions - 0.5, indexing='ij')
+    ring_radius, ring_angle = np.meshgrid(np.sqrt(fractions), 2 * np.pi * fractions, indexing='ij')
+    disk_a, disk_b = ring_radius * np.cos(ring_angle), ring_radius * np.sin(ring_angle)
+
+    is_circle = (shapes == CIRCLE)[:, np.newaxis]
+    offset_a = np.where(is_circle, radii[:, np.newaxis] * disk_a.ravel(), lengths[:, np.newaxis] * grid_a.ravel())
+    offset_b = np.where(is_circle, radii[:, np.newaxis] * disk_b.ravel(), widths[:, np.newaxis] * grid_b.ravel())
+    return np.stack([offset_a, offset_b], axis=-1)
+
+class ShadingScene:
+    def __init__(self, solar_panels, positions=None, samples=8):
+        """Scene of solar panels placed at an (N,3) array of positions (panel centres, in meters). solar_panels is a
+        SolarPanelArray, whose own positions are used when positions is None, or a list of SolarPanelRectangle and
+        SolarPanelCircle objects. samples² points are traced per panel, so the shaded fraction has a resolution of
+        1/samples²."""
+        if not isinstance(solar_panels, SolarPanelArray):
+            solar_panels = SolarPanelArray.from_panels(solar_panels)
+        self.positions = np.asarray(solar_panels.positions if positions is None else positions, dtype=float)
+        self.surface_normals = normalize_vectors(solar_panels.surface_normals)
+        self.shapes = np.asarray(solar_panels.shapes)
+        self.lengths = np.asarray(solar_panels.lengths)
+        self.widths = np.asarray(solar_panels.widths)
+        self.radii = np.asarray(solar_panels.radii)
+
+        # In-plane directions of the length and width of each panel, turned with the panel from lying flat
+        orientations = get_rotation_from_up(self.surface_normals)
+        self.length_axes = orientations[..., 0]
+        self.width_axes = orientations[..., 1]
+        # Radius of the sphere around each panel's centre that contains the whole panel
+        self.bounding_radii = np.where(self.shapes == CIRCLE, self.radii, np.hypot(self.lengths, self.widths) / 2)
+        self.sample_offsets = get_sample_offsets(self.shapes, self.lengths, self.widths, self.radii, samples)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def get_shaded_fractions(self, sunlight, max_pairs=65536):
+        """Return the shaded fraction of every panel for a Sunlight ((N,) result) or a SunlightSeries ((...,N)
+        result). Panels are unshaded while the sun is below the horizon. max_pairs limits how many (panel, occluder)
+        pairs are traced at once, which bounds memory use."""
+        directions = normalize_vectors(np.asarray(sunlight.direction, dtype=float))
+        fractions = np.zeros(directions.shape[:-1] + (len(self),))
+        for index in np.ndindex(directions.shape[:-1]):
+            if directions[index][2] < 0: # sunlight travels downwards, so the sun is above the horizon
+                fractions[index] = self.get_shaded_fractions_for_direction(directions[index], max_pairs)
+        return fractions
+
+    def get_shaded_fractions_for_direction(self, direction, max_pairs=65536):
+        """Return the shaded fraction of every panel for one normalized sunlight direction."""
+        receivers, occluders = self.get_candidate_pairs(direction)
+        samples = self.sample_offsets.shape[1]
+        shaded = np.zeros((len(self), samples), dtype=bool)
+
+        for first in range(0, len(receivers), max_pairs):
+            pair_receivers = receivers[first:first + max_pairs]
+            pair_occluders = occluders[first:first + max_pairs]
+            hits = self.trace_pairs(direction, pair_receivers, pair_occluders)
+            pair_index, sample_index = np.nonzero(hits)
+            shaded[pair_receivers[pair_index], sample_index] = True
+        return shaded.mean(axis=1)
+
+    def get_candidate_pairs(self, direction):
+        """Return (receiver, occluder) index arrays of panels whose outlines may overlap when seen from the sun.
+
+        Panel centres are projected onto the plane perpendicular to the sunlight and hashed into square cells as
+        wide as the largest panel, so overlapping panels are always in the same or a neighbouring cell."""
+        first_axis = normalize_vector(np.cross(direction, [1.0, 0.0, 0.0] if abs(direction[0]) < 0.9 else [0.0, 1.0, 0.0]))
+        second_axis = np.cross(direction, first_axis)
+        projected = np.stack([self.positions @ first_axis, self.positions @ second_axis], axis=-1)
+        depths = -self.positions @ direction # larger is closer to the sun
+
+        cell_size = max(2 * self.bounding_radii.max(), 1e-9)
+        cells = np.floor(projected / cell_size).astype(np.int64)
+        cells -= cells.min(axis=0) - 1 # keep neighbouring cells non-negative
+        columns = cells[:, 1].max() + 2
+        keys = cells[:, 0] * columns + cells[:, 1]
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        receivers = []
+        occluders = []
+        for offset_x in (-1, 0, 1):
+            for offset_y in (-1, 0, 1):
+                neighbour_keys = keys + offset_x * columns + offset_y
+                starts = np.searchsorted(sorted_keys, neighbour_keys, side='left')
+                counts = np.searchsorted(sorted_keys, neighbour_keys, side='right') - starts
+                pair_receivers = np.repeat(np.arange(len(self)), counts)
+                pair_offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                receivers.append(pair_receivers)
+                occluders.append(order[np.repeat(starts, counts) + pair_offsets])
+        receivers = np.concatenate(receivers)
+        occluders = np.concatenate(occluders)
+
+        # Keep pairs whose bounding circles overlap in projection and where the occluder reaches towards the sun
+        reach = self.bounding_radii[receivers] + self.bounding_radii[occluders]
+        overlapping = np.sum((projected[receivers] - projected[occluders]) ** 2, axis=-1) < reach ** 2
+        in_front = depths[occluders] + self.bounding_radii[occluders] > depths[receivers] - self.bounding_radii[receivers]
+        keep = (receivers != occluders) & overlapping & in_front
+        return receivers[keep], occluders[keep]
+
+    def trace_pairs(self, direction, receivers, occluders):
+        """Return a (pairs, samples) mask of receiver sample points whose path to the sun crosses the occluder."""
+        offsets = self.sample_offsets[receivers]
+        points = (self.positions[receivers][:, np.newaxis]
+                  + offsets[..., 0:1] * self.length_axes[receivers][:, np.newaxis]
+                  + offsets[..., 1:2] * self.width_axes[receivers][:, np.newaxis])
+
+        # Distance from each point towards the sun to the occluder's plane
+        occluder_normals = self.surface_normals[occluders]
+        facing = occluder_normals @ direction
+        edge_on = np.abs(facing) < 1e-12 # a plane seen edge-on casts no shadow
+        relative = points - self.positions[occluders][:, np.newaxis]
+        distances = np.einsum('pkj,pj->pk', relative, occluder_normals) / np.where(edge_on, 1, facing)[:, np.newaxis]
+
+        # Where that ray meets the occluder plane, in the occluder's own coordinates
+        hit_points = relative - distances[..., np.newaxis] * direction
+        hit_a = np.einsum('pkj,pj->pk', hit_points, self.length_axes[occluders])
+        hit_b = np.einsum('pkj,pj->pk', hit_points, self.width_axes[occluders])
+
+        is_circle = (self.shapes[occluders] == CIRCLE)[:, np.newaxis]
+        inside_disk = hit_a ** 2 + hit_b ** 2 <= self.radii[occluders][:, np.newaxis] ** 2
+        inside_rectangle = ((np.abs(hit_a) <= self.lengths[occluders][:, np.newaxis] / 2)
+                            & (np.abs(hit_b) <= self.widths[occluders][:, np.newaxis] / 2))
+        inside = np.where(is_circle, inside_disk, inside_rectangle)
+        return inside & (distances > 1e-9) & ~edge_on[:, np.newaxis]
@@ -5,9 +5,15 @@ from vpython import *
 import os
 import sys
 
+import irradiance
+import physics
+from change_tracking import ChangeTracker
+from orientation_cache import OrientationCache
+from rotation import get_panel_axes
 from sunlight import Sunlight
 from solar_panels import *
 from graph3D import *
+from farm_view import FarmView
 
 running = True
 def end_sim():
@@ -18,9 +24,14 @@ def restart_program():
     scene.delete()
     os.execl(sys.executable, sys.executable, *sys.argv)
 
+# Callbacks timed when a Simulation is given an Instrumentation
+INSTRUMENTED_CALLBACKS = ["update_spn_x", "update_spn_y", "update_spn_z", "update_spn_x_btn", "update_spn_y_btn",
+                          "update_spn_z_btn", "reset_orientation", "align_plane_to_normal"]
+
 class Simulation:
-    def __init__(self, sunlight, solar_panel):
+    def __init__(self, sunlight, solar_panel, instrumentation=None, irradiance_model=None, recorder=None):
         self.sunlight = sunlight # sunlight vector
+        self.irradiance_model = irradiance_model # e.g. irradiance.PerezSkyModel(), None for beam light only
         # Convert np.array containing direction of sunlight to vector usable in vpython
         self.sun_vector = array_to_vector(*self.sunlight.direction)
         self.sun_pos_radius = 6
@@ -30,28 +41,84 @@ class Simulation:
         self.solar_panel_surface_normal_vector = array_to_vector(*self.solar_panel.surface_normal)
 
         self.magnitude = sunlight.magnitude * solar_panel.area
-        self.dot_product = np.clip(np.dot(sunlight.direction, solar_panel.surface_normal), -1.0, 1.0)
+        self.dot_product = physics.get_dot_product(sunlight, solar_panel)
         self.electricity = self.get_electricity() # Store value for total electricity collected by solar panel
 
-        self.model = Graph3D(1000, 800) # Set up scene
+        self.orientation_cache = OrientationCache() # Shared by every slider and button update
+        self.model = None # Scene is set up when it is first drawn, so physics queries never open one
+        self.changes = ChangeTracker() # Only push values to vpython when they change
+        self.pending_sliders = {} # Latest slider widget per axis, applied once per frame
+
+        # Optional recording of slider and button events to a session file (session_recording.SessionRecorder)
+        self.recorder = recorder
+        if recorder is not None:
+            recorder.attach(self)
+
+        # Optional timing of the event loop and callbacks, nothing is wrapped when it is None
+        self.instrumentation = instrumentation
+        if instrumentation is not None:
+            instrumentation.instrument(self, INSTRUMENTED_CALLBACKS)
 
 
     def get_electricity(self):
         """Return the total electricity given a sunlight vector, area vector, and solar panel efficiency."""
-        result = -1 * self.magnitude * self.dot_product * self.solar_panel.efficiency
-        if result < 0: # negative electricity is an unphysical result in this scenario
-            result = 0
-        return result
+        if self.irradiance_model is not None:
+            return irradiance.get_fleet_electricity(self.irradiance_model, self.sunlight, [self.solar_panel.surface_normal],
+                                                    self.solar_panel.area, self.solar_panel.efficiency)[0]
+        return physics.get_electricity(self.sunlight, self.solar_panel, self.dot_product)
+
+    def update_electricity(self):
+        """Recompute the dot product and electricity after the surface normal changed."""
+        # Slider steps repeat so most orientations are already cached
+        self.dot_product, _, self.electricity = self.orientation_cache.get(self.sunlight, self.solar_panel)
+        if self.irradiance_model is not None: # the cache holds beam light results only
+            self.electricity = self.get_electricity()
 
     def get_angle_radians(self):
-        return np.arccos(self.dot_product)
+        return physics.get_angle_radians(self.dot_product)
 
     def get_angle_degrees(self):
         return np.degrees(self.get_angle_radians())
 
     def graph_vector_representation(self):
         """Create simulation for flat solar panels. TODO complete description"""
+        self.draw_scene()
+
+        '''As the program runs...'''
+        while running:
+            rate(60)  # Keeps the scene running
+            if self.instrumentation is not None:
+                self.instrumentation.tick()
+
+            # Apply the slider events of this frame, then lock the overlay to the main scene
+            self.apply_slider_updates()
+            self.sync_overlay_camera()
+
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def sync_overlay_camera(self):
+        """Copy the main scene camera to the overlay, skipping the values that did not change."""
+        self.changes.set(self.model.overlay.camera, "pos", scene.camera.pos)
+        self.changes.set(self.model.overlay.camera, "axis", scene.camera.axis)
+        self.changes.set(self.model.overlay.camera, "up", scene.camera.up)
+
+    def queue_slider_update(self, axis, widget):
+        """Slider callback: remember the slider until the next frame, so a burst of events becomes one update."""
+        self.changes.forget(widget, "value") # the user moved it, so the value pushed last is no longer on screen
+        self.pending_sliders[axis] = widget
+
+    def apply_slider_updates(self):
+        """Apply the latest value of every slider moved since the last frame."""
+        pending, self.pending_sliders = self.pending_sliders, {}
+        for axis, widget in pending.items():
+            (self.update_spn_x, self.update_spn_y, self.update_spn_z)[axis](widget)
+
+    def draw_scene(self):
+        """Draw the sun, the solar panel, labels, buttons and sliders, then display the scene."""
         scene.visible = False  # display nothing
+        if self.model is None:
+            self.model = Graph3D(1000, 800) # Set up scene
 
         # Store original values for x y z for reset button
         self.orig_xyz = vector(self.solar_panel_surface_normal_vector.x,self.solar_panel_surface_normal_vector.y,self.solar_panel_surface_normal_vector.z)
@@ -76,12 +143,12 @@ class Simulation:
             solar_panel_box = box(canvas=scene,pos=self.model.origin, length = solar_c*self.solar_panel.length*top_panel_scale, width = solar_c*self.solar_panel.width*top_panel_scale, height = solar_c*self.solar_panel.height,color=color.black)
             solar_panel_texture = box(canvas=scene,pos=solar_panel_box.pos+vector(0,0.02,0), length = solar_c*self.solar_panel.length, width = solar_c*self.solar_panel.width, height = 0.1, color=color.white)
             scene.select()
-            self.solar_panel_plane = compound([solar_panel_texture, solar_panel_box],texture="textures/SolarPanel002_1K-JPG_Color.jpg", shininess=1)
+            self.solar_panel_plane = compound([solar_panel_texture, solar_panel_box],texture=SOLAR_PANEL_TEXTURE, shininess=1)
         elif self.solar_panel.name == "Circle":
             solar_panel_disk = cylinder(canvas=scene,pos=self.model.origin,radius=solar_c*self.solar_panel.radius*top_panel_scale, axis=solar_c*vector(0,self.solar_panel.height,0), color=color.black)
             solar_panel_texture = cylinder(canvas=scene, pos=solar_panel_disk.pos + vec(0, 0.04, 0),radius=solar_c*self.solar_panel.radius, axis=vector(0,0.06,0), color=color.white)
             scene.select()
-            self.solar_panel_plane = compound([solar_panel_texture, solar_panel_disk], texture="textures/SolarPanel002_1K-JPG_Color.jpg", shininess=1)
+            self.solar_panel_plane = compound([solar_panel_texture, solar_panel_disk], texture=SOLAR_PANEL_TEXTURE, shininess=1)
 
 
 
@@ -91,8 +158,10 @@ class Simulation:
         # Label the surface normal vector
         self.solar_panel_label = label(canvas=scene, pos=(self.model.origin + self.solar_panel_surface_normal_vector) * 1.2, text=', '.join(f"{x:.2f}" for x in self.solar_panel.surface_normal), color=color.white, box=False)
 
-        # Rotate solar panel plane to align with its solar panel
-        self.align_plane_to_normal(vector(0,1,0))
+        # Remember the plane lying flat, then set it to face the surface normal
+        self.plane_length = mag(self.solar_panel_plane.axis)
+        self.plane_offset = vector_to_array(self.solar_panel_plane.pos.x, self.solar_panel_plane.pos.y, self.solar_panel_plane.pos.z).tolist()
+        self.align_plane_to_normal()
 
         '''Labels'''
         # Add Label displaying total electricity
@@ -111,7 +180,7 @@ class Simulation:
         # Buttons to end and restart simulation
         btn_end = button(canvas=controls, text="  END  ", bind=lambda _: end_sim(), background=color.white)
         controls.append_to_caption(" "*5)
-        btn_restart = button(canvas=controls, text="RESTART", bind=lambda _: restart_program(), background=color.white)
+        btn_restart = button(canvas=controls, text="RESTART", bind=lambda _: self.restart_program(), background=color.white)
 
         controls.append_to_caption("\n\n\n    ")
 
@@ -150,20 +219,20 @@ class Simulation:
         controls.append_to_caption("\n\n\n    Solar Panel")
         controls.append_to_caption("\n\n    Rotate Y Axis (X) ")
         button(canvas=controls, text="-", bind= lambda _:self.update_spn_x_btn(self.solar_panel_surface_normal_vector.x - limit_magnitude/ds))
-        self.slider_spn_x = slider(canvas=controls,min=-limit_magnitude, max=limit_magnitude, step=limit_magnitude/ds, length=slider_length, value = np.clip(self.solar_panel_surface_normal_vector.x,-1,1), bind= self.update_spn_x)
+        self.slider_spn_x = slider(canvas=controls,min=-limit_magnitude, max=limit_magnitude, step=limit_magnitude/ds, length=slider_length, value = np.clip(self.solar_panel_surface_normal_vector.x,-1,1), bind=lambda widget: self.queue_slider_update(0, widget))
         button(canvas=controls, text="+", bind= lambda _:self.update_spn_x_btn(self.solar_panel_surface_normal_vector.x + limit_magnitude/ds))
 
         #slider_spn_x = slider(min=-180, max=180, length=360, value=0, bind=self.rotate_around_y) #TODO doesn't work properly
         controls.append_to_caption("\n    ")
         controls.append_to_caption("\n\n    Rotate X Axis (Y) ")
         button(canvas=controls, text="-", bind= lambda _:self.update_spn_y_btn(-self.solar_panel_surface_normal_vector.z - limit_magnitude/ds))
-        self.slider_spn_y = slider(canvas=controls,min=-limit_magnitude, max=limit_magnitude, step=limit_magnitude/ds,length=slider_length, value = np.clip(-self.solar_panel_surface_normal_vector.z,-1,1), bind= self.update_spn_y)
+        self.slider_spn_y = slider(canvas=controls,min=-limit_magnitude, max=limit_magnitude, step=limit_magnitude/ds,length=slider_length, value = np.clip(-self.solar_panel_surface_normal_vector.z,-1,1), bind=lambda widget: self.queue_slider_update(1, widget))
         button(canvas=controls, text="+",bind=lambda _: self.update_spn_y_btn(-self.solar_panel_surface_normal_vector.z + limit_magnitude / ds))
 
         controls.append_to_caption("\n    ")
         controls.append_to_caption("\n\n                   Tilt (Z) ")
         button(canvas=controls, text="-", bind=lambda _: self.update_spn_z_btn(self.solar_panel_surface_normal_vector.y - limit_magnitude / ds))
-        self.slider_spn_z = slider(canvas=controls,min=-limit_magnitude, max=limit_magnitude, step=limit_magnitude/ds,length=slider_length, value=np.clip(self.solar_panel_surface_normal_vector.y,-1,1), bind=self.update_spn_z)
+        self.slider_spn_z = slider(canvas=controls,min=-limit_magnitude, max=limit_magnitude, step=limit_magnitude/ds,length=slider_length, value=np.clip(self.solar_panel_surface_normal_vector.y,-1,1), bind=lambda widget: self.queue_slider_update(2, widget))
         button(canvas=controls, text="+", bind=lambda _: self.update_spn_z_btn(self.solar_panel_surface_normal_vector.y + limit_magnitude / ds ))
 
         # only allow user to rotate their camera
@@ -186,26 +255,25 @@ class Simulation:
         '''Display scene after loading textures'''
         scene.waitfor("textures")
         scene.visible = True  # now display everything
-        '''As the program runs...'''
-        while running:
-            rate(60)  # Keeps the scene running
 
-            # Lock the overlay to the main scene
-            self.model.overlay.camera.pos = scene.camera.pos
-            self.model.overlay.camera.axis = scene.camera.axis
-            self.model.overlay.camera.up = scene.camera.up
-
-    def align_plane_to_normal(self, original_normal):
-        """Update the alignment of the solar panel object based on the surface normal vector."""
-        rotation_axis = cross(original_normal, self.solar_panel_surface_normal_vector)
-        if mag(rotation_axis) > 1e-6:
-            rotation_angle = diff_angle(original_normal, self.solar_panel_surface_normal_vector)
-            self.solar_panel_plane.rotate(angle=rotation_angle, axis=rotation_axis, origin=vector(0, 0, 0))
+    def restart_program(self):
+        """Restart button callback, a method so it can be recorded."""
+        restart_program()
+
+    def align_plane_to_normal(self):
+        """Set the orientation of the solar panel object from the surface normal: the smallest rotation from lying flat.
+        Set absolutely rather than turned from the previous normal, so repeated updates do not drift."""
+        x, y, z = self.solar_panel.surface_normal.tolist()
+        if x == y == z == 0: # a zero normal has no orientation, keep the last one
+            return
+        length_axis, width_axis = get_panel_axes(x, y, z)
+        offset_x, offset_y, offset_z = self.plane_offset
+        pos = [offset_x * a + offset_y * b + offset_z * c for a, b, c in zip(length_axis, width_axis, (x, y, z))]
+        self.changes.set(self.solar_panel_plane, "pos", array_to_vector(*pos))
+        self.changes.set(self.solar_panel_plane, "axis", array_to_vector(*length_axis) * self.plane_length)
+        self.changes.set(self.solar_panel_plane, "up", self.solar_panel_surface_normal_vector)
 
     def reset_orientation(self):
-        # Get original orientation
-        original_orientation = vector(self.solar_panel_surface_normal_vector.x,self.solar_panel_surface_normal_vector.y,self.solar_panel_surface_normal_vector.z)
-
         # Reset surface normal vector and arrow
         self.solar_panel.surface_normal = vector_to_array(self.orig_xyz.x,self.orig_xyz.y,self.orig_xyz.z)
         # Normalize np.array
@@ -214,25 +282,23 @@ class Simulation:
         self.solar_panel_surface_normal_vector = array_to_vector(*self.solar_panel.surface_normal)
 
         # Update arrow orientation and label text
-        self.solar_panel_surface_normal_arrow.axis = self.solar_panel_surface_normal_vector
-        self.solar_panel_label.text = ', '.join(f"{x:.2f}" for x in self.solar_panel.surface_normal)
+        self.changes.set(self.solar_panel_surface_normal_arrow, "axis", self.solar_panel_surface_normal_vector)
+        self.changes.set(self.solar_panel_label, "text", ', '.join(f"{x:.2f}" for x in self.solar_panel.surface_normal))
 
         # Rotate solar panel orientation
-        self.align_plane_to_normal(original_orientation)
+        self.align_plane_to_normal()
 
         # Reset sliders
-        self.slider_spn_x.value = self.solar_panel_surface_normal_vector.x
-        self.slider_spn_y.value = -self.solar_panel_surface_normal_vector.z
-        self.slider_spn_z.value = self.solar_panel_surface_normal_vector.y
+        self.changes.set(self.slider_spn_x, "value", self.solar_panel_surface_normal_vector.x)
+        self.changes.set(self.slider_spn_y, "value", -self.solar_panel_surface_normal_vector.z)
+        self.changes.set(self.slider_spn_z, "value", self.solar_panel_surface_normal_vector.y)
 
         # Update values for electricity
-        self.dot_product = np.clip(np.dot(self.sunlight.direction, self.solar_panel.surface_normal), -1.0, 1.0)
-        self.electricity = self.get_electricity()
-        self.electricity_label.text = f"Electricity: {self.electricity + 0.0:.2f} Watts"
+        self.update_electricity()
+        self.changes.set(self.electricity_label, "text", f"Electricity: {self.electricity + 0.0:.2f} Watts")
 
     def update_solar_panel_normal(self, axis, component, is_button=False):
         """Update solar panel surface normal z component """
-        previous_vector = vector(self.solar_panel_surface_normal_vector.x, self.solar_panel_surface_normal_vector.y,self.solar_panel_surface_normal_vector.z)
         self.solar_panel.surface_normal[axis] = component
         # Normalize np.array
         self.solar_panel.surface_normal = normalize_vector(self.solar_panel.surface_normal)
@@ -240,16 +306,15 @@ class Simulation:
         self.solar_panel_surface_normal_vector = array_to_vector(*self.solar_panel.surface_normal)
 
         # Update arrow orientation and label text
-        self.solar_panel_surface_normal_arrow.axis = self.solar_panel_surface_normal_vector
-        self.solar_panel_label.text = ', '.join(f"{x:.2f}" for x in self.solar_panel.surface_normal)
+        self.changes.set(self.solar_panel_surface_normal_arrow, "axis", self.solar_panel_surface_normal_vector)
+        self.changes.set(self.solar_panel_label, "text", ', '.join(f"{x:.2f}" for x in self.solar_panel.surface_normal))
 
         # Rotate solar panel orientation
-        self.align_plane_to_normal(previous_vector)
+        self.align_plane_to_normal()
 
         # Update values for electricity
-        self.dot_product = np.clip(np.dot(self.sunlight.direction, self.solar_panel.surface_normal), -1.0, 1.0)
-        self.electricity = self.get_electricity()
-        self.electricity_label.text = f"Electricity: {self.electricity + 0.0:.2f} Watts"
+        self.update_electricity()
+        self.changes.set(self.electricity_label, "text", f"Electricity: {self.electricity + 0.0:.2f} Watts")
 
         # Update other two sliders
         self.update_sliders(axis, is_button)
@@ -281,27 +346,27 @@ class Simulation:
     def update_sliders(self, axis, is_button):
         if is_button:
             if axis == 0:
-                self.slider_spn_x.value = self.solar_panel_surface_normal_vector.x
-                self.slider_spn_y.value = -self.solar_panel_surface_normal_vector.z
-                self.slider_spn_z.value = self.solar_panel_surface_normal_vector.y
+                self.changes.set(self.slider_spn_x, "value", self.solar_panel_surface_normal_vector.x)
+                self.changes.set(self.slider_spn_y, "value", -self.solar_panel_surface_normal_vector.z)
+                self.changes.set(self.slider_spn_z, "value", self.solar_panel_surface_normal_vector.y)
             elif axis == 1:
-                self.slider_spn_x.value = self.solar_panel_surface_normal_vector.x
-                self.slider_spn_y.value = -self.solar_panel_surface_normal_vector.z
-                self.slider_spn_z.value = self.solar_panel_surface_normal_vector.y
+                self.changes.set(self.slider_spn_x, "value", self.solar_panel_surface_normal_vector.x)
+                self.changes.set(self.slider_spn_y, "value", -self.solar_panel_surface_normal_vector.z)
+                self.changes.set(self.slider_spn_z, "value", self.solar_panel_surface_normal_vector.y)
             elif axis == 2:
-                self.slider_spn_x.value = self.solar_panel_surface_normal_vector.x
-                self.slider_spn_y.value = -self.solar_panel_surface_normal_vector.z
-                self.slider_spn_z.value = self.solar_panel_surface_normal_vector.y
+                self.changes.set(self.slider_spn_x, "value", self.solar_panel_surface_normal_vector.x)
+                self.changes.set(self.slider_spn_y, "value", -self.solar_panel_surface_normal_vector.z)
+                self.changes.set(self.slider_spn_z, "value", self.solar_panel_surface_normal_vector.y)
         else:
             if axis == 0:
-                self.slider_spn_y.value = -self.solar_panel_surface_normal_vector.z
-                self.slider_spn_z.value = self.solar_panel_surface_normal_vector.y
+                self.changes.set(self.slider_spn_y, "value", -self.solar_panel_surface_normal_vector.z)
+                self.changes.set(self.slider_spn_z, "value", self.solar_panel_surface_normal_vector.y)
             elif axis == 1:
-                self.slider_spn_x.value = self.solar_panel_surface_normal_vector.x
-                self.slider_spn_z.value = self.solar_panel_surface_normal_vector.y
+                self.changes.set(self.slider_spn_x, "value", self.solar_panel_surface_normal_vector.x)
+                self.changes.set(self.slider_spn_z, "value", self.solar_panel_surface_normal_vector.y)
             elif axis == 2:
-                self.slider_spn_x.value = self.solar_panel_surface_normal_vector.x
-                self.slider_spn_y.value = -self.solar_panel_surface_normal_vector.z
+                self.changes.set(self.slider_spn_x, "value", self.solar_panel_surface_normal_vector.x)
+                self.changes.set(self.slider_spn_y, "value", -self.solar_panel_surface_normal_vector.z)
 
     def get_sun_pos(self):
         """Convert unit vector to position on sphere for sun position coordinates."""
@@ -361,6 +426,12 @@ def run_test(experiment):
             sim = Simulation(sunray, square_panel)  # Create simulation
 
             sim.graph_vector_representation()
+        case 8: # Farm of 20 rows of 30 panels tilted towards the south, distant rows drawn with less detail.
+            rows = np.stack(np.meshgrid(np.arange(30) * 3.0, np.arange(20) * 6.0), axis=-1).reshape(-1, 2)
+            farm_panels = SolarPanelArray.rectangles(len(rows), 2, 1, 0.04, np.array([0, -0.5, 1]), 0.2)
+            farm_panels.positions = np.column_stack([rows - rows.mean(axis=0), np.zeros(len(rows))])
+
+            FarmView(farm_panels).run()
 
 if __name__ == '__main__':
     run_test(4)
\ No newline at end of file
@@ -1,6 +1,11 @@
 import numpy as np
 from vector_methods import *
 
+# Shape codes used by the array based fleet code (shading, fleet_io)
+RECTANGLE = 0
+CIRCLE = 1
+GENERIC = 2
+
 class SolarPanel:
     def __init__(self, name = "", area = 0.0, surface_vector = np.array([0, 0, 1]), efficiency = 1):
         self.name = name
@@ -37,3 +42,189 @@ class SolarPanelCircle(SolarPanel):
         self.height = height
 
 
+class SolarPanelArray:
+    def __init__(self, surface_normals, areas, efficiencies=1, shapes=GENERIC, lengths=0, widths=0, radii=0,
+                 heights=0, positions=None, name_ids=0, names=("",)):
+        """Structure of arrays holding many solar panels: one array per field instead of one object per panel.
+        Indexing returns a SolarPanelView, which behaves like a SolarPanelRectangle or SolarPanelCircle and can be
+        used wherever a single solar panel is used. Surface normals are stored as given (normalize them first).
+        Generic panels are named by name_ids, indices into the string table names; rectangles and circles get their
+        names from their dimensions."""
+        self.surface_normals = np.asanyarray(surface_normals, dtype=float).reshape(-1, 3)
+        count = len(self.surface_normals)
+        self.areas = self._get_column(areas, count, float)
+        self.efficiencies = self._get_column(efficiencies, count, float)
+        self.shapes = self._get_column(shapes, count, np.uint8)
+        self.lengths = self._get_column(lengths, count, float)
+        self.widths = self._get_column(widths, count, float)
+        self.radii = self._get_column(radii, count, float)
+        self.heights = self._get_column(heights, count, float)
+        self.positions = np.zeros((count, 3)) if positions is None else np.asanyarray(positions, dtype=float)
+        self.name_ids = self._get_column(name_ids, count, np.uint32)
+        self.names = list(names)
+
+    @staticmethod
+    def _get_column(values, count, dtype):
+        """Return values as a column of count entries, repeating a scalar. Arrays of the right dtype are kept as they
+        are, memmaps included, so memory-mapped columns can still be flushed."""
+        if np.ndim(values) == 0:
+            return np.full(count, values, dtype=dtype)
+        return np.asanyarray(values, dtype=dtype)
+
+    @classmethod
+    def rectangles(cls, count, length=5, width=5, height=0.25, surface_vectors=np.array([0, 0, 1]), efficiency=1):
+        """Creates count rectangle shaped solar panels. surface_vectors may be one vector or one per panel."""
+        surface_normals = normalize_vectors(np.broadcast_to(np.asarray(surface_vectors, dtype=float), (count, 3)))
+        return cls(surface_normals, np.multiply(length, width), efficiency, RECTANGLE, length, width, 0, height)
+
+    @classmethod
+    def circles(cls, count, radius=5, height=0.25, surface_vectors=np.array([0, 0, 1]), efficiency=1):
+        """Creates count circle shaped solar panels. surface_vectors may be one vector or one per panel."""
+        surface_normals = normalize_vectors(np.broadcast_to(np.asarray(surface_vectors, dtype=float), (count, 3)))
+        return cls(surface_normals, np.pi * np.square(radius), efficiency, CIRCLE, 0, 0, radius, height)
+
+    @classmethod
+    def from_panels(cls, solar_panels, positions=None):
+        """Creates a SolarPanelArray from a list of SolarPanel objects and an optional (N,3) array of positions."""
+        shapes = [CIRCLE if panel.name == "Circle" else RECTANGLE if panel.name in ("Square", "Rectangle") else GENERIC
+                  for panel in solar_panels]
+        name_table = {"": 0}
+        name_ids = [name_table.setdefault(panel.name, len(name_table)) if shape == GENERIC else 0
+                    for panel, shape in zip(solar_panels, shapes)]
+        return cls(np.array([panel.surface_normal for panel in solar_panels], dtype=float),
+                   [panel.area for panel in solar_panels],
+                   [panel.efficiency for panel in solar_panels],
+                   shapes,
+                   [getattr(panel, "length", 0) for panel in solar_panels],
+                   [getattr(panel, "width", 0) for panel in solar_panels],
+                   [getattr(panel, "radius", 0) for panel in solar_panels],
+                   [getattr(panel, "height", 0) for panel in solar_panels],
+                   positions, name_ids, list(name_table))
+
+    def to_panels(self, start=0, stop=None):
+        """Return SolarPanel objects for the panels start to stop, keeping the stored names, normals and areas
+        exactly."""
+        solar_panels = []
+        for view in self[start:stop]:
+            surface_normal = np.array(view.surface_normal)
+            if view.shape == RECTANGLE:
+                solar_panel = SolarPanelRectangle(view.length, view.width, view.height, surface_normal, view.efficiency)
+            elif view.shape == CIRCLE:
+                solar_panel = SolarPanelCircle(view.radius, view.height, surface_normal, view.efficiency)
+            else:
+                solar_panel = SolarPanel(view.name, view.area, surface_normal, view.efficiency)
+            solar_panel.surface_normal = surface_normal
+            solar_panel.area = view.area
+            solar_panels.append(solar_panel)
+        return solar_panels
+
+    @property
+    def columns(self):
+        """Return the arrays of the collection by name. The names string table is not a column."""
+        return {"surface_normals": self.surface_normals, "areas": self.areas, "efficiencies": self.efficiencies,
+                "shapes": self.shapes, "lengths": self.lengths, "widths": self.widths, "radii": self.radii,
+                "heights": self.heights, "positions": self.positions, "name_ids": self.name_ids}
+
+    def flush(self):
+        """Write changes to memory-mapped columns (e.g. from fleet_io.create_fleet) to disk. In-memory columns are
+        left alone."""
+        for column in self.columns.values():
+            if isinstance(column, np.memmap):
+                column.flush()
+
+    def __len__(self):
+        return len(self.areas)
+
+    def __getitem__(self, index):
+        """Return a SolarPanelView for an integer index, or a SolarPanelArray sharing the arrays for a slice."""
+        if isinstance(index, slice):
+            return SolarPanelArray(names=self.names, **{name: column[index] for name, column in self.columns.items()})
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("SolarPanelArray index out of range")
+        return SolarPanelView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield SolarPanelView(self, index)
+
+    def print(self):
+        """Prints the area and surface normal of every solar panel."""
+        for view in self:
+            view.print()
+
+class SolarPanelView:
+    """A single solar panel stored in a SolarPanelArray. Reading or assigning its fields reads or writes the arrays."""
+    __slots__ = ("panels", "index")
+
+    def __init__(self, panels, index):
+        self.panels = panels
+        self.index = index
+
+    @property
+    def shape(self):
+        return self.panels.shapes[self.index]
+
+    @property
+    def name(self):
+        if self.shape == CIRCLE:
+            return "Circle"
+        if self.shape == RECTANGLE:
+            return "Square" if self.length == self.width else "Rectangle"
+        return self.panels.names[self.panels.name_ids[self.index]]
+
+    @property
+    def area(self):
+        return self.panels.areas[self.index].item()
+
+    @area.setter
+    def area(self, value):
+        self.panels.areas[self.index] = value
+
+    @property
+    def surface_normal(self):
+        return self.panels.surface_normals[self.index] # a view, so item assignment writes through
+
+    @surface_normal.setter
+    def surface_normal(self, value):
+        self.panels.surface_normals[self.index] = value
+
+    @property
+    def efficiency(self):
+        return self.panels.efficiencies[self.index].item()
+
+    @efficiency.setter
+    def efficiency(self, value):
+        self.panels.efficiencies[self.index] = value
+
+    def _get_dimension(self, column, shape, name):
+        """Return a dimension only for the shapes that have it, like the attributes of the panel classes."""
+        if self.shape != shape:
+            raise AttributeError(f"'{self.name}' solar panel has no attribute '{name}'")
+        return column[self.index].item()
+
+    @property
+    def length(self):
+        return self._get_dimension(self.panels.lengths, RECTANGLE, "length")
+
+    @property
+    def width(self):
+        return self._get_dimension(self.panels.widths, RECTANGLE, "width")
+
+    @property
+    def radius(self):
+        return self._get_dimension(self.panels.radii, CIRCLE, "radius")
+
+    @property
+    def height(self):
+        return self.panels.heights[self.index].item()
+
+    @property
+    def position(self):
+        return self.panels.positions[self.index]
+
+    def print(self):
+        """Prints the area and surface normal of the solar panel."""
+        SolarPanel.print(self)
+
@@ -0,0 +1,94 @@
+import numpy as np
+from sunlight import SunlightSeries
+
+# Coordinates follow Sunlight: x points east, y points north and z points up. A sunlight direction points from the
+# sun towards the ground, so it is the negative of the direction of the sun in the sky.
+
+J2000 = np.datetime64('2000-01-01T12:00:00') # reference epoch of the solar position formulas
+SOLAR_CONSTANT = 1361 # W/m², irradiance at 1 AU outside the atmosphere
+
+def get_days_since_j2000(times):
+    """Return the (fractional) number of days between J2000 and an array of UTC np.datetime64 timestamps."""
+    return (np.asarray(times, dtype='datetime64[ns]') - J2000) / np.timedelta64(1, 'D')
+
+def get_sun_position(latitude, longitude, times):
+    """Return unit vectors pointing from the ground towards the sun and the Earth-Sun distance in AU.
+
+    Uses the low precision formulas of the Astronomical Almanac (about 0.01° accuracy between 1950 and 2050), evaluated
+    for every timestep at once. latitude and longitude are in degrees (east positive) and may be arrays of sites; they
+    broadcast against times, so latitude[:, np.newaxis] with a (T,) array of times gives (sites, T, 3) vectors."""
+    n = get_days_since_j2000(times)
+    latitude = np.radians(latitude)
+
+    # Ecliptic coordinates of the sun
+    mean_longitude = np.radians((280.460 + 0.9856474 * n) % 360)
+    mean_anomaly = np.radians((357.528 + 0.9856003 * n) % 360)
+    ecliptic_longitude = mean_longitude + np.radians(1.915 * np.sin(mean_anomaly) + 0.020 * np.sin(2 * mean_anomaly))
+    obliquity = np.radians(23.439 - 0.0000004 * n)
+
+    # Equatorial coordinates
+    right_ascension = np.arctan2(np.cos(obliquity) * np.sin(ecliptic_longitude), np.cos(ecliptic_longitude))
+    sin_declination = np.sin(obliquity) * np.sin(ecliptic_longitude)
+    cos_declination = np.sqrt(1 - sin_declination ** 2)
+
+    # Local hour angle from the Greenwich mean sidereal time
+    sidereal_time = np.radians((280.46061837 + 360.98564736629 * n) % 360)
+    hour_angle = sidereal_time + np.radians(longitude) - right_ascension
+
+    # Horizontal coordinates as an (east, north, up) unit vector
+    cos_hour_angle = np.cos(hour_angle)
+    east = -cos_declination * np.sin(hour_angle)
+    north = np.cos(latitude) * sin_declination - np.sin(latitude) * cos_declination * cos_hour_angle
+    up = np.sin(latitude) * sin_declination + np.cos(latitude) * cos_declination * cos_hour_angle
+    sun_vectors = np.stack(np.broadcast_arrays(east, north, up), axis=-1)
+
+    distance = 1.00014 - 0.01671 * np.cos(mean_anomaly) - 0.00014 * np.cos(2 * mean_anomaly)
+    return sun_vectors, distance
+
+def get_air_mass(cos_zenith):
+    """Return the relative (Kasten-Young) air mass for the cosine of the solar zenith angle. Below the horizon the
+    air mass of the sun at the zenith is returned, callers mask those timesteps out."""
+    cos_zenith = np.where(cos_zenith > 0, cos_zenith, 1) # avoid dividing by zero below the horizon
+    zenith_degrees = np.degrees(np.arccos(np.minimum(cos_zenith, 1)))
+    return 1 / (cos_zenith + 0.50572 * (96.07995 - zenith_degrees) ** -1.6364)
+
+def get_clear_sky_irradiance(sun_vectors, distance):
+    """Return the direct normal irradiance (W/m²) for a clear sky given sun vectors and the Earth-Sun distance.
+
+    Uses the Kasten-Young air mass with the Meinel attenuation model. The irradiance is zero when the sun is below
+    the horizon."""
+    above_horizon = sun_vectors[..., 2] > 0
+    air_mass = get_air_mass(sun_vectors[..., 2])
+    extraterrestrial = SOLAR_CONSTANT / distance ** 2
+    irradiance = extraterrestrial * 0.7 ** (air_mass ** 0.678)
+    return np.where(above_horizon, irradiance, 0.0)
+
+def get_sun_vectors(latitude, longitude, times, clear_sky=True):
+    """Return a SunlightSeries for a site (or an array of sites) over an array of UTC timestamps.
+
+    Magnitudes are the clear-sky direct normal irradiance in W/m², or the extraterrestrial irradiance when clear_sky
+    is False; they are zero while the sun is below the horizon. The series can be passed straight to
+    fleet.get_fleet_electricity."""
+    sun_vectors, distance = get_sun_position(latitude, longitude, times)
+    if clear_sky:
+        magnitudes = get_clear_sky_irradiance(sun_vectors, distance)
+    else:
+        magnitudes = np.where(sun_vectors[..., 2] > 0, SOLAR_CONSTANT / distance ** 2, 0.0)
+    return SunlightSeries(magnitudes, -sun_vectors) # sunlight travels away from the sun
+
+def get_time_range(start, stop, step=np.timedelta64(1, 'm')):
+    """Return the UTC timestamps from start (inclusive) to stop (exclusive) every step."""
+    return np.arange(np.datetime64(start), np.datetime64(stop), step)
+
+def iter_sun_vectors(latitude, longitude, start, stop, step=np.timedelta64(1, 'm'), chunk_size=1440, clear_sky=True):
+    """Yield (times, SunlightSeries) chunks covering start to stop every step, at most chunk_size timesteps at a time.
+
+    Only one chunk is held in memory, so a full year at minute resolution (525,600 steps) for many sites can be
+    streamed through the fleet calculations. Timestamps are generated chunk by chunk as well."""
+    start = np.datetime64(start)
+    step = np.timedelta64(step)
+    count = int(np.ceil((np.datetime64(stop) - start) / step))
+
+    for first in range(0, count, chunk_size):
+        times = start + step * np.arange(first, min(first + chunk_size, count))
+        yield times, get_sun_vectors(latitude, longitude, times, clear_sky)
@@ -11,4 +11,27 @@ class Sunlight:
 
     def print(self):
         """Prints the magnitude and direction of the vector."""
-        print(f"Magnitude: {self.magnitude}, Direction: ({', '.join(map(str, self.direction))})")
\ No newline at end of file
+        print(f"Magnitude: {self.magnitude}, Direction: ({', '.join(map(str, self.direction))})")
+
+class SunlightSeries:
+    def __init__(self, magnitudes, directions):
+        """Series of sunlight vectors, e.g. one per timestep. Magnitudes have shape (...) and directions (...,3); each
+        direction is normalized. Exposes the same magnitude and direction attributes as Sunlight, as arrays, so it can
+        be passed to the fleet calculations directly."""
+        self.magnitude = np.asarray(magnitudes)
+        self.direction = normalize_vectors(directions) # normalize directions if not already normalized
+
+    def __len__(self):
+        return len(self.magnitude)
+
+    def __getitem__(self, index):
+        """Return a Sunlight for a single entry, or a SunlightSeries for a slice."""
+        magnitude = self.magnitude[index]
+        if np.ndim(magnitude) == 0:
+            return Sunlight(magnitude, self.direction[index])
+        return SunlightSeries(magnitude, self.direction[index])
+
+    def print(self):
+        """Prints the magnitude and direction of every vector."""
+        for magnitude, direction in zip(self.magnitude.reshape(-1), self.direction.reshape(-1, 3)):
+            print(f"Magnitude: {magnitude}, Direction: ({', '.join(map(str, direction))})")
@@ -0,0 +1,146 @@
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import irradiance
+from energy_yield import EnergyIntegrator
+from fleet import get_fleet_electricity
+from fleet_io import save_fleet
+from solar_panels import *
+from sunlight import SunlightSeries
+from vector_methods import *
+
+# Parameter sweeps over panel designs and sun series, spread over a process pool. The design columns and the sun
+# series are copied once into shared memory blocks that every worker maps, so tasks only carry block names and index
+# ranges. Each worker writes its energies straight into the memory-mapped result files, so results reach the disk as
+# soon as a task finishes and the main process only tracks progress.
+
+def get_design_grid(solar_panels, tilts, azimuths, efficiencies):
+    """Return (SolarPanelArray, parameters) for every combination of a template panel (its shape and dimensions are
+    used, its normal is not), tilt and azimuth in degrees, and efficiency. parameters holds the panel, tilt, azimuth
+    and efficiency of each design point."""
+    templates = SolarPanelArray.from_panels(solar_panels)
+    combinations = np.array(list(itertools.product(range(len(templates)), tilts, azimuths, efficiencies)), dtype=float)
+    panel_index = combinations[:, 0].astype(np.intp)
+
+    designs = SolarPanelArray(get_normal_from_tilt_azimuth(combinations[:, 1], combinations[:, 2]),
+                              templates.areas[panel_index], combinations[:, 3], templates.shapes[panel_index],
+                              templates.lengths[panel_index], templates.widths[panel_index],
+                              templates.radii[panel_index], templates.heights[panel_index])
+    parameters = {"panel": panel_index, "tilt": combinations[:, 1], "azimuth": combinations[:, 2],
+                  "efficiency": combinations[:, 3]}
+    return designs, parameters
+
+def _share(array, blocks):
+    """Copy an array into a new shared memory block and return its (name, shape, dtype) description."""
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    blocks.append(block)
+    return block.name, array.shape, array.dtype.str
+
+_attached = {} # shared memory blocks mapped by this worker process, by name
+
+def _attach(description):
+    """Map a shared memory block described by _share without copying it."""
+    name, shape, dtype = description
+    if name not in _attached:
+        # Pool workers share the main process's resource tracker, so the block is still unlinked only once
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype, buffer=_attached[name].buf)
+
+def _run_task(shared, series_bounds, first, last, output_path, step_hours, time_chunk, irradiance_model, method):
+    """Compute the energy and peak power of designs first to last for every sun series and write them to the result
+    files. Energy is integrated by an EnergyIntegrator, so it matches energy_yield for the same method. Returns the
+    number of (design, timestep) evaluations."""
+    surface_normals = _attach(shared["surface_normals"])[first:last]
+    areas = _attach(shared["areas"])[first:last]
+    efficiencies = _attach(shared["efficiencies"])[first:last]
+    magnitudes = _attach(shared["magnitudes"])
+    directions = _attach(shared["directions"])
+
+    energy = np.load(os.path.join(output_path, "energy.npy"), mmap_mode="r+")
+    peak_power = np.load(os.path.join(output_path, "peak_power.npy"), mmap_mode="r+")
+    step = np.timedelta64(round(step_hours * 3_600_000_000_000), 'ns') # series are evenly sampled from time zero
+    for series, (start, stop) in enumerate(series_bounds):
+        integrator = EnergyIntegrator(surface_normals, areas, efficiencies, method, irradiance_model)
+        peak = np.zeros(last - first)
+        for chunk_start in range(start, stop, time_chunk):
+            chunk_stop = min(chunk_start + time_chunk, stop)
+            times = np.datetime64(0, 'ns') + np.arange(chunk_start - start, chunk_stop - start) * step
+            sunlight = SunlightSeries(magnitudes[chunk_start:chunk_stop], directions[chunk_start:chunk_stop])
+            if irradiance_model is None:
+                power = get_fleet_electricity(sunlight, surface_normals, areas, efficiencies, normalize=False)
+            else:
+                power = irradiance.get_fleet_electricity(irradiance_model, sunlight, surface_normals, areas,
+                                                         efficiencies)
+            integrator.add_power(times, power)
+            np.maximum(peak, power.max(axis=0, initial=0), out=peak)
+        energy[series, first:last] = integrator.get_energy()
+        peak_power[series, first:last] = peak
+    energy.flush()
+    peak_power.flush()
+    return (last - first) * (series_bounds[-1][1] - series_bounds[0][0])
+
+def print_progress(done, total, evaluations, elapsed):
+    """Default progress report: tasks finished and (design, timestep) evaluations per second."""
+    print(f"\r{done}/{total} tasks, {evaluations / max(elapsed, 1e-9):,.0f} panel-steps/s, {elapsed:.1f} s",
+          end="\n" if done == total else "", file=sys.stderr, flush=True)
+
+def run_sweep(output_path, designs, sunlight_series, step_hours=1 / 60, parameters=None, workers=None,
+              designs_per_task=1024, time_chunk=1440, progress=print_progress, irradiance_model=None,
+              method="trapezoid"):
+    """Compute the energy (Wh) and peak power (W) of every design in a SolarPanelArray for every SunlightSeries in a
+    list, on a pool of workers (one per CPU by default). step_hours is the time between samples of the series, and
+    energy is integrated over them with method ("trapezoid" or "simpson") like energy_yield.EnergyIntegrator.
+    Power comes from beam light only unless an irradiance model (see irradiance) is given.
+
+    output_path becomes a directory holding the designs as a fleet, parameters (e.g. from get_design_grid) as json,
+    and energy.npy and peak_power.npy of shape (series, designs), written as tasks finish. Returns the memory-mapped
+    energy and peak power arrays."""
+    os.makedirs(output_path, exist_ok=True)
+    save_fleet(os.path.join(output_path, "designs"), designs)
+    if parameters is not None:
+        with open(os.path.join(output_path, "parameters.json"), "w") as file:
+            json.dump({name: np.asarray(values).tolist() for name, values in parameters.items()}, file)
+    shape = (len(sunlight_series), len(designs))
+    np.lib.format.open_memmap(os.path.join(output_path, "energy.npy"), mode="w+", shape=shape).flush()
+    np.lib.format.open_memmap(os.path.join(output_path, "peak_power.npy"), mode="w+", shape=shape).flush()
+
+    # Every series goes into one block; series_bounds says where each one starts and stops
+    lengths = [len(series.magnitude) for series in sunlight_series]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    series_bounds = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    blocks = []
+    try:
+        shared = {
+            "surface_normals": _share(normalize_vectors(designs.surface_normals), blocks),
+            "areas": _share(designs.areas, blocks),
+            "efficiencies": _share(designs.efficiencies, blocks),
+            "magnitudes": _share(np.concatenate([series.magnitude for series in sunlight_series]), blocks),
+            "directions": _share(np.concatenate([series.direction for series in sunlight_series]), blocks),
+        }
+        ranges = [(first, min(first + designs_per_task, len(designs)))
+                  for first in range(0, len(designs), designs_per_task)]
+        start = time.perf_counter()
+        evaluations = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_task, shared, series_bounds, first, last, output_path, step_hours,
+                                       time_chunk, irradiance_model, method) for first, last in ranges]
+            for done, future in enumerate(as_completed(futures), start=1):
+                evaluations += future.result()
+                if progress is not None:
+                    progress(done, len(futures), evaluations, time.perf_counter() - start)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return (np.load(os.path.join(output_path, "energy.npy"), mmap_mode="r"),
+            np.load(os.path.join(output_path, "peak_power.npy"), mmap_mode="r"))
@@ -0,0 +1,75 @@
+import numpy as np
+import physics
+from rotation import get_axis_angle_rotations
+from vector_methods import *
+
+# Closed form orientations for solar trackers. For each sunlight direction d the tracker picks the surface normal n
+# inside its angle limits that maximizes -dot(d, n), i.e. the one facing the sun as directly as possible.
+
+def get_dual_axis_normals(sunlight, max_tilt=90):
+    """Return the (...,3) surface normals of a dual-axis tracker for a Sunlight or SunlightSeries. The normal points
+    straight at the sun unless that would tilt it more than max_tilt degrees from vertical, in which case it is
+    tilted max_tilt degrees towards the sun's azimuth."""
+    sun_facing = -np.asarray(sunlight.direction, dtype=float)
+    horizontal = sun_facing.copy()
+    horizontal[..., 2] = 0
+    horizontal = normalize_vectors(horizontal)
+    horizontal[np.all(horizontal == 0, axis=-1)] = [1, 0, 0] # sun straight below, any azimuth is as good as another
+
+    # The best normal within the limit lies on the cone boundary, at the sun's azimuth
+    limited = horizontal * np.sin(np.radians(max_tilt))
+    limited[..., 2] = np.cos(np.radians(max_tilt))
+
+    within_limit = sun_facing[..., 2] >= np.cos(np.radians(max_tilt))
+    return np.where(within_limit[..., np.newaxis], sun_facing, limited)
+
+def get_single_axis_basis(axis):
+    """Return the surface normal at zero rotation and the direction it turns towards for a tracker rotating about
+    axis. The zero rotation normal is the vertical projected perpendicular to the axis."""
+    axis = normalize_vector(np.asarray(axis, dtype=float))
+    rest_normal = normalize_vector(np.array([0.0, 0.0, 1.0]) - axis[2] * axis)
+    return rest_normal, np.cross(axis, rest_normal)
+
+def get_single_axis_angles(sunlight, axis=(0, 1, 0), max_angle=60):
+    """Return the rotation angles in degrees of a single-axis tracker for a Sunlight or SunlightSeries. The default
+    axis runs north-south, so positive angles turn the panel east. Angles are limited to [-max_angle, max_angle]."""
+    rest_normal, turn_direction = get_single_axis_basis(axis)
+    sun_facing = -np.asarray(sunlight.direction, dtype=float)
+
+    # dot(sun_facing, n(angle)) = r * cos(angle - ideal), so the ideal angle is solved directly
+    ideal = np.arctan2(sun_facing @ turn_direction, sun_facing @ rest_normal)
+
+    # Outside the limits the best angle is whichever limit is closer to the ideal one
+    limit = np.radians(max_angle)
+    lower_is_closer = np.cos(-limit - ideal) > np.cos(limit - ideal)
+    angles = np.where(np.abs(ideal) <= limit, ideal, np.where(lower_is_closer, -limit, limit))
+    return np.degrees(angles)
+
+def get_single_axis_normals(sunlight, axis=(0, 1, 0), max_angle=60):
+    """Return the (...,3) surface normals of a single-axis tracker for a Sunlight or SunlightSeries."""
+    rest_normal, turn_direction = get_single_axis_basis(axis)
+    angles = np.radians(get_single_axis_angles(sunlight, axis, max_angle))[..., np.newaxis]
+    return np.cos(angles) * rest_normal + np.sin(angles) * turn_direction
+
+def get_tracker_electricity(sunlight, surface_normals, area=1, efficiency=1):
+    """Return the electricity at every timestep given a SunlightSeries and one surface normal per timestep."""
+    dot_products = physics.get_dot_products(np.asarray(sunlight.direction, dtype=float),
+                                            np.asarray(surface_normals, dtype=float), paired=True)
+    result = -1 * sunlight.magnitude * area * dot_products * efficiency
+    return np.clip(result, 0, None) # negative electricity is an unphysical result in this scenario
+
+def get_tracker_gain(sunlight, surface_normals, fixed_normal, area=1, efficiency=1):
+    """Return the relative energy gain (0.25 means 25% more) of a tracker over a fixed panel facing fixed_normal for
+    a SunlightSeries sampled at even timesteps."""
+    tracker_energy = np.sum(get_tracker_electricity(sunlight, surface_normals, area, efficiency), axis=-1)
+    fixed_normal = np.broadcast_to(normalize_vector(np.asarray(fixed_normal, dtype=float)), sunlight.direction.shape)
+    fixed_energy = np.sum(get_tracker_electricity(sunlight, fixed_normal, area, efficiency), axis=-1)
+    return tracker_energy / fixed_energy - 1
+
+def get_rotated_normals(surface_normals, angles, axis=(0, 1, 0)):
+    """Return the (...,N,3) normals of N panels on single-axis trackers turned by angles (degrees, shape (...), e.g.
+    one per timestep), given their (N,3) normals at zero rotation. One rotation matrix is built per angle and applied
+    to every panel, so wind stow is the same call with the stow angle at the stowed timesteps, e.g.
+    np.where(high_wind, 0, get_single_axis_angles(sunlight, axis))."""
+    rotations = get_axis_angle_rotations(axis, angles)
+    return np.einsum('...ij,nj->...ni', rotations, np.asarray(surface_normals, dtype=float).reshape(-1, 3))
@@ -1,15 +1,26 @@
+import math
 import numpy as np
-from vpython import *
+
+def get_norms(vectors):
+    """Returns the (...) lengths of an (...,3) array of vectors."""
+    # summed component by component so a panel normalizes identically alone or in a fleet (np.linalg.norm of a single
+    # vector uses a BLAS dot product that rounds differently) and without the slow reduction over a length 3 axis
+    squares = vectors[..., 0] * vectors[..., 0]
+    squares = squares + vectors[..., 1] * vectors[..., 1]
+    squares = squares + vectors[..., 2] * vectors[..., 2]
+    return np.sqrt(squares)
 
 def normalize_vector(vector):
     """Returns a normalized vector given a vector."""
-    norm = np.linalg.norm(vector)
+    x, y, z = np.asarray(vector, dtype=float).tolist() # same sums as get_norms, without numpy's overhead for a single vector
+    norm = math.sqrt(x * x + y * y + z * z)
     if norm != 0:
         return vector / norm
     return vector
 
 def array_to_vector(x, y, z):
     """Convert np.array from numpy to vector from vpython."""
+    from vpython import vector # imported here so the physics core runs without vpython
     vec_x = x
     vec_y = z
     vec_z = -y
@@ -20,4 +31,19 @@ def vector_to_array(x, y , z):
     vec_x = x
     vec_y = -z
     vec_z = y
-    return np.array([vec_x, vec_y, vec_z])
\ No newline at end of file
+    return np.array([vec_x, vec_y, vec_z])
+
+def normalize_vectors(vectors):
+    """Returns an (...,3) array of normalized vectors given an (...,3) array of vectors. Zero vectors are left as is."""
+    vectors = np.asarray(vectors)
+    norms = get_norms(vectors)
+    norms = np.where(norms == 0, 1, norms) # leave zero vectors untouched, same as normalize_vector
+    return vectors / norms[..., np.newaxis]
+
+def get_normal_from_tilt_azimuth(tilt, azimuth):
+    """Returns the (...,3) surface normals of panels tilted tilt degrees from horizontal towards azimuth degrees
+    (clockwise from north, y axis) given arrays or scalars of tilt and azimuth."""
+    tilt = np.radians(tilt)
+    azimuth = np.radians(azimuth)
+    return np.stack(np.broadcast_arrays(np.sin(tilt) * np.sin(azimuth), np.sin(tilt) * np.cos(azimuth),
+                                        np.cos(tilt)), axis=-1)
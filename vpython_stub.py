@@ -0,0 +1,201 @@
+import math
+import sys
+import types
+
+# Minimal stand-in for the parts of vpython used by the simulation. Objects keep their attributes and vectors do
+# real arithmetic, but nothing is drawn and no browser or server is started. Used to run and benchmark the
+# interactive code paths headless: call install() before importing simulation.
+
+class vector:
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def __add__(self, other):
+        return vector(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return vector(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __mul__(self, scale):
+        return vector(self.x * scale, self.y * scale, self.z * scale)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scale):
+        return vector(self.x / scale, self.y / scale, self.z / scale)
+
+    def __neg__(self):
+        return vector(-self.x, -self.y, -self.z)
+
+    def __eq__(self, other):
+        return isinstance(other, vector) and (self.x, self.y, self.z) == (other.x, other.y, other.z)
+
+    def __repr__(self):
+        return f"<{self.x:.6g}, {self.y:.6g}, {self.z:.6g}>"
+
+    @property
+    def mag(self):
+        return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+    def norm(self):
+        length = self.mag
+        return self / length if length else vector(0, 0, 0)
+
+    def dot(self, other):
+        return self.x * other.x + self.y * other.y + self.z * other.z
+
+    def cross(self, other):
+        return vector(self.y * other.z - self.z * other.y, self.z * other.x - self.x * other.z,
+                      self.x * other.y - self.y * other.x)
+
+    def diff_angle(self, other):
+        lengths = self.mag * other.mag
+        if lengths == 0:
+            return 0.0
+        return math.acos(max(-1.0, min(1.0, self.dot(other) / lengths)))
+
+    def rotate(self, angle=0.0, axis=None):
+        """Rotate about an axis through the origin (Rodrigues' formula)."""
+        axis = vector(0, 0, 1) if axis is None else axis.norm()
+        cos_angle, sin_angle = math.cos(angle), math.sin(angle)
+        return self * cos_angle + axis.cross(self) * sin_angle + axis * (axis.dot(self) * (1 - cos_angle))
+
+vec = vector
+
+def cross(a, b):
+    return a.cross(b)
+
+def dot(a, b):
+    return a.dot(b)
+
+def mag(a):
+    return a.mag
+
+def norm(a):
+    return a.norm()
+
+def diff_angle(a, b):
+    return a.diff_angle(b)
+
+def radians(degrees):
+    return math.radians(degrees)
+
+def rate(frequency):
+    pass
+
+class _Color:
+    red = vector(1, 0, 0)
+    green = vector(0, 1, 0)
+    blue = vector(0, 0, 1)
+    yellow = vector(1, 1, 0)
+    white = vector(1, 1, 1)
+    black = vector(0, 0, 0)
+
+    @staticmethod
+    def gray(luminance):
+        return vector(luminance, luminance, luminance)
+
+color = _Color()
+
+class _Widget:
+    """Any vpython object or widget: keeps whatever attributes it is given."""
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+class _Object(_Widget):
+    """3D object with a position, an axis and an up direction."""
+    def __init__(self, **attributes):
+        self.pos = vector(0, 0, 0)
+        self.axis = vector(1, 0, 0)
+        self.up = vector(0, 1, 0)
+        super().__init__(**attributes)
+
+    def rotate(self, angle=0.0, axis=None, origin=None):
+        axis = self.axis if axis is None else axis
+        origin = self.pos if origin is None else origin
+        self.pos = origin + (self.pos - origin).rotate(angle, axis)
+        self.axis = self.axis.rotate(angle, axis)
+        self.up = self.up.rotate(angle, axis)
+
+    def clone(self, **attributes):
+        copied = type(self)(**self.__dict__)
+        copied.__dict__.update(attributes)
+        return copied
+
+class box(_Object):
+    pass
+
+class cylinder(_Object):
+    pass
+
+class sphere(_Object):
+    pass
+
+class arrow(_Object):
+    pass
+
+class label(_Object):
+    pass
+
+class compound(_Object):
+    def __init__(self, objects, **attributes):
+        super().__init__(**attributes)
+        self.objects = objects
+
+class wtext(_Widget):
+    pass
+
+class button(_Widget):
+    pass
+
+class slider(_Widget):
+    pass
+
+class _Camera(_Widget):
+    def __init__(self):
+        super().__init__(pos=vector(0, 0, 10), axis=vector(0, 0, -10), up=vector(0, 1, 0))
+
+    def rotate(self, angle=0.0, axis=None, origin=None):
+        self.axis = self.axis.rotate(angle, axis)
+        self.up = self.up.rotate(angle, axis)
+
+class canvas(_Widget):
+    def __init__(self, **attributes):
+        self.camera = _Camera()
+        self.lights = [_Widget(direction=vector(0.22, 0.44, 0.88), color=color.gray(0.8)),
+                       _Widget(direction=vector(-0.88, -0.22, -0.44), color=color.gray(0.3))]
+        self.visible = True
+        super().__init__(**attributes)
+
+    def select(self):
+        pass
+
+    def append_to_caption(self, text):
+        pass
+
+    def waitfor(self, event):
+        pass
+
+    def delete(self):
+        self.visible = False
+
+scene = canvas()
+
+def reset_scene():
+    """Put the shared scene back in the state a freshly started program sees, e.g. before drawing a Simulation again."""
+    attributes = list(vars(scene))
+    for name in attributes:
+        delattr(scene, name)
+    canvas.__init__(scene)
+
+def install():
+    """Register this module as vpython, so later imports of vpython (and simulation) get the stub."""
+    sys.modules["vpython"] = sys.modules[__name__]
+    return sys.modules[__name__]
+
+__all__ = ["vector", "vec", "cross", "dot", "mag", "norm", "diff_angle", "radians", "rate", "color", "box", "cylinder",
+           "sphere", "arrow", "label", "compound", "wtext", "button", "slider", "canvas", "scene"]